@@ -1,34 +1,607 @@
+import functools
 import hashlib
+import itertools
+import json
+import logging
 import math
+import multiprocessing
+import os
+import pickle
+import queue
+import random
 import re
-from collections import Counter, defaultdict
-from datetime import datetime
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import types
+import unicodedata
+import uuid
+from collections import Counter, OrderedDict, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing, contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from io import BytesIO
+from urllib.parse import urlparse
 
-import pdfplumber
-import qrcode
+import numpy as np
 import requests
 import streamlit as st
-from PIL import Image
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
-from reportlab.platypus import Paragraph, SimpleDocTemplate
+from requests.adapters import HTTPAdapter
 
 # =========================
 # STREAMLIT CONFIG
 # =========================
-st.set_page_config(page_title="CitatIA", page_icon="📚", layout="wide")
+# st.set_page_config é chamado em main(): importar este módulo (CLI, scripts) não mexe na página
+# Registro de recursos guardado em sys.modules: o Streamlit reexecuta app.py como um módulo novo a
+# cada rerun, mas sys.modules é do processo. Ao contrário de st.cache_resource, vale em qualquer thread
+# (workers da fila, atualização em segundo plano do cache), com ou sem ScriptRunContext.
+_RESOURCES = sys.modules.setdefault("_citatia_resources", types.ModuleType("_citatia_resources"))
+_RESOURCES.__dict__.setdefault("values", {})
+_RESOURCES.__dict__.setdefault("lock", threading.RLock())
+
+
+def process_resource(func):
+    # Recurso único por processo, criado na primeira chamada; .clear() descarta (recriado na próxima)
+    key = f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper():
+        try:
+            return _RESOURCES.values[key]
+        except KeyError:
+            pass
+        with _RESOURCES.lock:
+            if key not in _RESOURCES.values:
+                _RESOURCES.values[key] = func()
+            return _RESOURCES.values[key]
+
+    def clear():
+        with _RESOURCES.lock:
+            _RESOURCES.values.pop(key, None)
+
+    wrapper.clear = clear
+    return wrapper
+
+# =========================
+# MÉTRICAS (spans por etapa, contadores, export Prometheus)
+# =========================
+METRICS_PORT = int(os.environ.get("CITATIA_METRICS_PORT", "0"))  # 0 = sem endpoint /metrics
+METRICS_LOG = os.environ.get("CITATIA_METRICS_LOG", "") == "1"
+METRICS_RESERVOIR = 1024  # amostras recentes por série para p50/p95
+ADMIN_TOKEN = os.environ.get("CITATIA_ADMIN_TOKEN", "")
+
+logger = logging.getLogger("citatia")
+
+
+class Metrics:
+    def __init__(self):
+        self.counters = Counter()
+        self._timings = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _series(name: str, labels: dict):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def incr(self, name: str, value=1, **labels) -> None:
+        with self._lock:
+            self.counters[self._series(name, labels)] += value
+
+    def observe(self, stage: str, seconds: float, **labels) -> None:
+        series = self._series(stage, labels)
+        with self._lock:
+            timing = self._timings.get(series)
+            if timing is None:
+                timing = self._timings[series] = [0, 0.0, deque(maxlen=METRICS_RESERVOIR)]
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2].append(seconds)
+        if METRICS_LOG:
+            extra = "".join(f" {k}={v}" for k, v in series[1])
+            logger.info("span stage=%s duration_ms=%.1f%s", stage, seconds * 1000, extra)
+
+    @contextmanager
+    def span(self, stage: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, **labels)
+
+    def register(self, name: str, collector, gauges=()) -> None:
+        # collector() -> dict de contadores de um componente (cliente HTTP, caches...); as chaves em
+        # gauges são valores instantâneos (tamanho de fila, workers) e saem como gauge, sem _total
+        with self._lock:
+            self._collectors[name] = (collector, frozenset(gauges))
+
+    def summary(self):
+        with self._lock:
+            timings = {k: (v[0], v[1], sorted(v[2])) for k, v in self._timings.items()}
+            counters = dict(self.counters)
+            collectors = dict(self._collectors)
+        gauges = {}
+        rows = []
+        for (stage, labels), (count, total, samples) in sorted(timings.items()):
+            rows.append(
+                {
+                    "stage": stage,
+                    "labels": dict(labels),
+                    "count": count,
+                    "sum": total,
+                    "p50": _quantile(samples, 0.5),
+                    "p95": _quantile(samples, 0.95),
+                }
+            )
+        for component, (collector, gauge_keys) in collectors.items():
+            for key, value in collector().items():
+                (gauges if key in gauge_keys else counters)[(f"{component}_{key}", ())] = value
+        return rows, counters, gauges
+
+    def render_prometheus(self) -> str:
+        rows, counters, gauges = self.summary()
+        lines = ["# TYPE citatia_stage_seconds summary"]
+        for row in rows:
+            labels = {"stage": row["stage"], **row["labels"]}
+            for q in ("0.5", "0.95"):
+                lines.append(f"citatia_stage_seconds{_prom_labels({**labels, 'quantile': q})} {row['p50' if q == '0.5' else 'p95']:.6f}")
+            lines.append(f"citatia_stage_seconds_sum{_prom_labels(labels)} {row['sum']:.6f}")
+            lines.append(f"citatia_stage_seconds_count{_prom_labels(labels)} {row['count']}")
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE citatia_{name}_total counter")
+            for (series_name, labels), value in sorted(counters.items()):
+                if series_name == name:
+                    lines.append(f"citatia_{name}_total{_prom_labels(dict(labels))} {value}")
+        for (name, labels), value in sorted(gauges.items()):
+            lines.append(f"# TYPE citatia_{name} gauge")
+            lines.append(f"citatia_{name}{_prom_labels(dict(labels))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _quantile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+def _prom_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in labels.items())
+    return "{" + ",".join(escaped) + "}"
+
+
+@process_resource
+def get_metrics() -> Metrics:
+    if METRICS_LOG and not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+    return Metrics()
+
+
+@process_resource
+def get_metrics_server():
+    # Endpoint Prometheus em thread própria (o Streamlit não expõe rotas HTTP customizadas)
+    if not METRICS_PORT:
+        return None
+    metrics = get_metrics()
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_response(404)
+                self.end_headers()
+                return
+            payload = metrics.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer(("0.0.0.0", METRICS_PORT), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="citatia-metrics", daemon=True).start()
+    return server
 
 # =========================
 # ENDPOINTS
 # =========================
 URL_GOOGLE_SHEETS = "https://script.google.com/macros/s/AKfycbyHRCrD5-A_JHtaUDXsGWQ22ul9ml5vvK3YYFzIE43jjCdip0dBMFH_Jmd8w971PLte/exec"
-SEMANTIC_API = "https://api.semanticscholar.org/graph/v1/paper/search"
-CROSSREF_API = "https://api.crossref.org/works"
+SEMANTIC_API = os.environ.get("CITATIA_SEMANTIC_API", "https://api.semanticscholar.org/graph/v1/paper/search")
+CROSSREF_API = os.environ.get("CITATIA_CROSSREF_API", "https://api.crossref.org/works")
 
 # Crossref recomenda User-Agent com contato
 CROSSREF_HEADERS = {"User-Agent": "CitatIA/1.0 (mailto:contato@seu-email.com)"}
 
+# =========================
+# HTTP (pool de conexões compartilhado)
+# =========================
+HTTP_TIMEOUT = 20
+HTTP_POOL_SIZE = int(os.environ.get("CITATIA_HTTP_POOL_SIZE", "16"))
+FETCH_WORKERS = int(os.environ.get("CITATIA_FETCH_WORKERS", "8"))
+# Produtores do modo profundo (um por fonte, ocupam a thread durante toda a paginação): pool próprio,
+# para que análises profundas simultâneas não esgotem as threads das consultas normais
+DEEP_FETCH_WORKERS = int(os.environ.get("CITATIA_DEEP_FETCH_WORKERS", "8"))
+
+
+@process_resource
+def get_http_session() -> requests.Session:
+    # Uma sessão por processo: conexões keep-alive reaproveitadas entre reruns e sessões
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+@process_resource
+def get_fetch_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="citatia-fetch")
+
+
+@process_resource
+def get_deep_fetch_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=DEEP_FETCH_WORKERS, thread_name_prefix="citatia-deep-fetch")
+
+
+# Limites por host: (requisições/s, rajada). Semantic Scholar sem chave tolera bem pouco.
+HOST_RATE_LIMITS = {
+    "api.semanticscholar.org": (float(os.environ.get("CITATIA_S2_RATE", "1")), 3),
+    "api.crossref.org": (float(os.environ.get("CITATIA_CROSSREF_RATE", "10")), 20),
+}
+DEFAULT_RATE_LIMIT = (20.0, 40)
+HTTP_MAX_RETRIES = int(os.environ.get("CITATIA_HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE = 0.5
+HTTP_BACKOFF_MAX = 20.0
+HTTP_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        # Reserva um token (o saldo pode ficar negativo = fila de espera) e dorme o necessário
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = max(-self.tokens / self.rate, self.blocked_until - now, 0.0)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds: float) -> None:
+        # 429 com Retry-After: todo o tráfego para o host espera, não só a requisição que falhou
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class _InFlight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class HttpClient:
+    def __init__(self, session: requests.Session, metrics: Metrics, max_retries: int = HTTP_MAX_RETRIES):
+        self.session = session
+        self.metrics = metrics
+        self.max_retries = max_retries
+        self.stats = Counter()
+        self._buckets = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _incr(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += amount
+
+    def stats_snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+    def _bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(*HOST_RATE_LIMITS.get(host, DEFAULT_RATE_LIMIT))
+            return self._buckets[host]
+
+    def get(self, url: str, params=None, headers=None, timeout=HTTP_TIMEOUT) -> requests.Response:
+        # Singleflight: requisições idênticas simultâneas compartilham uma única ida ao upstream
+        key = (
+            url,
+            tuple(sorted((k, str(v)) for k, v in (params or {}).items())),
+            tuple(sorted((headers or {}).items())),
+        )
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _InFlight()
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.response
+
+        try:
+            call.response = self._get_with_retries(url, params, headers, timeout)
+            return call.response
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.event.set()
+
+    def _get_with_retries(self, url, params, headers, timeout) -> requests.Response:
+        host = urlparse(url).netloc
+        bucket = self._bucket(host)
+        for attempt in range(self.max_retries + 1):
+            if bucket.acquire() > 0:
+                self._incr("throttled")
+            self._incr("requests")
+            try:
+                with self.metrics.span("http_request", host=host):
+                    resp = self.session.get(url, params=params, headers=headers, timeout=timeout)
+                self.metrics.incr("http_responses", host=host, status=resp.status_code)
+                self.metrics.incr("http_response_bytes", len(resp.content), host=host)
+            except (requests.ConnectionError, requests.Timeout):
+                self.metrics.incr("http_responses", host=host, status="error")
+                if attempt == self.max_retries:
+                    self._incr("failures")
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                if resp.status_code not in HTTP_RETRY_STATUSES:
+                    return resp
+                if resp.status_code == 429:
+                    self._incr("rate_limited")
+                if attempt == self.max_retries:
+                    self._incr("failures")
+                    return resp
+                retry_after = _parse_retry_after(resp.headers.get("Retry-After"))
+                delay = min(retry_after, HTTP_BACKOFF_MAX) if retry_after is not None else self._backoff(attempt)
+                if resp.status_code == 429:
+                    bucket.pause(delay)
+            self._incr("retries")
+            time.sleep(delay)
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        # Exponencial com "full jitter" para que sessões concorrentes não sincronizem as novas tentativas
+        return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+
+def _parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+@process_resource
+def get_http_client() -> HttpClient:
+    metrics = get_metrics()
+    client = HttpClient(get_http_session(), metrics)
+    metrics.register("http", client.stats_snapshot)
+    return client
+
+# =========================
+# CACHE PERSISTENTE (SQLite, compartilhado entre workers/réplicas)
+# =========================
+CACHE_DIR = os.environ.get("CITATIA_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "citatia"))
+LITERATURE_CACHE_PATH = os.environ.get("CITATIA_LITERATURE_CACHE", os.path.join(CACHE_DIR, "literature.sqlite3"))
+LITERATURE_CACHE_TTL = int(os.environ.get("CITATIA_LITERATURE_TTL", str(60 * 60 * 24)))  # 24 h
+LITERATURE_CACHE_STALE_TTL = int(os.environ.get("CITATIA_LITERATURE_STALE_TTL", str(60 * 60 * 24 * 7)))  # 7 dias
+LITERATURE_CACHE_MAX_ENTRIES = int(os.environ.get("CITATIA_LITERATURE_MAX_ENTRIES", "5000"))
+PDF_TEXT_CACHE_TTL = int(os.environ.get("CITATIA_PDF_TEXT_TTL", str(60 * 60 * 24 * 30)))  # 30 dias
+PDF_TEXT_CACHE_MAX_ENTRIES = int(os.environ.get("CITATIA_PDF_TEXT_MAX_ENTRIES", "500"))
+
+
+class PersistentCache:
+    def __init__(self, path: str, table: str, ttl: int, stale_ttl: int, max_entries: int, dumps=None, loads=None):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # JSON por padrão; objetos Python (resultados de análise) usam pickle, gravado como BLOB
+        self.dumps = dumps or (lambda value: json.dumps(value, ensure_ascii=False))
+        self.loads = loads or json.loads
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.table = table
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        # WAL permite leitores concorrentes de vários processos apontando para o mesmo arquivo
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, payload TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_accessed ON {table}(accessed_at)")
+
+    def get(self, key: str):
+        # Retorna (valor, idade em segundos) ou None; entradas além da janela stale são ignoradas
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(f"SELECT payload, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            age = now - row[1]
+            if age > self.ttl + self.stale_ttl:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.stats["misses"] += 1
+                return None
+        try:
+            value = self.loads(row[0])
+        except Exception as exc:
+            # Entrada ilegível (formato antigo, classe renomeada, arquivo corrompido) = miss; sai do cache
+            logger.warning("Entrada ilegível descartada do cache %s: %s", self.table, exc)
+            with self._lock:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.stats["misses"] += 1
+                self.stats["load_errors"] += 1
+            return None
+        with self._lock:
+            self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self.stats["stale_hits" if age > self.ttl else "hits"] += 1
+        return value, age
+
+    def set(self, key: str, value) -> None:
+        now = time.time()
+        payload = self.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, payload, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, payload, now, now),
+            )
+            # LRU: mantém apenas as max_entries acessadas mais recentemente
+            evicted = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key NOT IN "
+                f"(SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT ?)",
+                (self.max_entries,),
+            ).rowcount
+            self.stats["evictions"] += max(evicted, 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def iter_values(self, prefix: str = ""):
+        # Varredura para tarefas offline (ex.: baselines): não conta como acesso no LRU nem nas stats
+        with self._lock:
+            keys = [
+                key
+                for (key,) in self._conn.execute(
+                    f"SELECT key FROM {self.table} WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+                )
+            ]
+        for key in keys:
+            with self._lock:
+                row = self._conn.execute(f"SELECT payload FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                continue
+            try:
+                value = self.loads(row[0])
+            except Exception:
+                continue  # ilegível: get() descarta quando for consultada
+            yield value
+
+    def refresh_async(self, key: str, loader) -> None:
+        # Stale-while-revalidate: no máximo uma atualização em andamento por chave neste processo
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                value = loader()
+                if value:
+                    self.set(key, value)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name="citatia-cache-refresh", daemon=True).start()
+
+
+@process_resource
+def get_literature_cache() -> PersistentCache:
+    cache = PersistentCache(
+        LITERATURE_CACHE_PATH,
+        "literature",
+        ttl=LITERATURE_CACHE_TTL,
+        stale_ttl=LITERATURE_CACHE_STALE_TTL,
+        max_entries=LITERATURE_CACHE_MAX_ENTRIES,
+    )
+    get_metrics().register("literature_cache", lambda: dict(cache.stats))
+    return cache
+
+
+@process_resource
+def get_pdf_text_cache() -> PersistentCache:
+    # Texto extraído é determinístico por conteúdo: chave = SHA-256 dos bytes do PDF
+    cache = PersistentCache(
+        LITERATURE_CACHE_PATH,
+        "pdf_text",
+        ttl=PDF_TEXT_CACHE_TTL,
+        stale_ttl=0,
+        max_entries=PDF_TEXT_CACHE_MAX_ENTRIES,
+    )
+    get_metrics().register("pdf_text_cache", lambda: dict(cache.stats))
+    return cache
+
+
+LITERATURE_CACHE_FORMAT = "r1"  # muda quando o formato serializado dos artigos muda (entradas antigas são ignoradas)
+
+
+def literature_cache_key(query: str, limit: int) -> str:
+    normalized = " ".join(tokenize(query))
+    return f"{LITERATURE_CACHE_FORMAT}:{limit}:{normalized}"
+
+# =========================
+# PDF (extração paralela por faixas de páginas)
+# =========================
+PDF_WORKERS = int(os.environ.get("CITATIA_PDF_WORKERS", str(os.cpu_count() or 1)))
+PDF_MAX_PAGES = int(os.environ.get("CITATIA_PDF_MAX_PAGES", "0"))  # 0 = todas
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("CITATIA_PDF_PARALLEL_MIN_PAGES", "24"))
+# Orçamentos: uploads acima de PDF_MAX_UPLOAD_MB são recusados; a extração para quando o RSS do
+# processo cresce mais de PDF_RSS_BUDGET_MB desde o início dela (0 = sem limite) e fica com as páginas
+# lidas até ali. Texto truncado assim não vai para o cache de texto (a próxima tentativa extrai de novo)
+PDF_MAX_UPLOAD_MB = int(os.environ.get("CITATIA_PDF_MAX_UPLOAD_MB", "200"))
+PDF_RSS_BUDGET_MB = int(os.environ.get("CITATIA_PDF_RSS_BUDGET_MB", "2048"))
+UPLOAD_DIR = os.path.join(CACHE_DIR, "uploads")
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Modo "amostra de tema": lê páginas até o ranking de palavras estabilizar (título, resumo, introdução)
+PDF_EXTRACTION_MODE = os.environ.get("CITATIA_PDF_EXTRACTION", "sample")  # "sample" | "full"
+THEME_SAMPLE_MAX_PAGES = int(os.environ.get("CITATIA_THEME_MAX_PAGES", "15"))
+THEME_SAMPLE_MAX_CHARS = int(os.environ.get("CITATIA_THEME_MAX_CHARS", "60000"))
+THEME_SAMPLE_MIN_CHARS = int(os.environ.get("CITATIA_THEME_MIN_CHARS", "4000"))
+THEME_SAMPLE_STABLE_PAGES = int(os.environ.get("CITATIA_THEME_STABLE_PAGES", "3"))
+THEME_TOP_N = 12
+
+
+@process_resource
+def get_pdf_executor() -> ProcessPoolExecutor:
+    # spawn, como no modo lote: fork a partir do servidor (Tornado, fila de jobs, threads de métricas e
+    # planilha, conexões SQLite) pode herdar um lock preso (import, logging, malloc) e travar o filho
+    return ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
 # =========================
 # STOPWORDS (sem NLTK, para não quebrar deploy)
 # =========================
@@ -57,7 +630,20 @@ AREA_KEYWORDS = {
     "Economics & Business": {"economy", "finance", "market", "business", "management", "innovation", "policy"},
     "Social Sciences": {"education", "social", "inequality", "public", "society", "behavior"},
 }
+# Taxonomia ampliada (ex.: categorias ASJC/WoS): JSON {"área": ["palavra", ...]} somado às áreas acima
+AREA_TAXONOMY_PATH = os.environ.get("CITATIA_AREA_TAXONOMY", "")
+
+
+def load_area_taxonomy(path: str, area_keywords: dict) -> None:
+    with open(path, encoding="utf-8") as f:
+        for area, words in json.load(f).items():
+            area_keywords.setdefault(area, set()).update(w.lower() for w in words)
+
+
+if AREA_TAXONOMY_PATH:
+    load_area_taxonomy(AREA_TAXONOMY_PATH, AREA_KEYWORDS)
 
+# Média de citações a priori por área: ponto de partida das baselines aprendidas (ver FieldBaselineTable)
 FIELD_BASELINES = {
     "Computer Science": 18,
     "Medicine": 30,
@@ -70,29 +656,233 @@ FIELD_BASELINES = {
 # =========================
 # GOOGLE SHEETS
 # =========================
+SHEETS_SPOOL_PATH = os.environ.get("CITATIA_SHEETS_SPOOL", os.path.join(CACHE_DIR, "sheets_spool.sqlite3"))
+# Padrão = uma linha por POST, no formato {nome, email, codigo} que o Apps Script em produção lê.
+# Lotes (> 1) vão como {"rows": [...]}: só aumentar depois que o script aceitar esse formato
+SHEETS_BATCH_SIZE = int(os.environ.get("CITATIA_SHEETS_BATCH_SIZE", "1"))
+SHEETS_FLUSH_INTERVAL = float(os.environ.get("CITATIA_SHEETS_FLUSH_INTERVAL", "2"))
+SHEETS_LEASE = 60  # linhas em envio ficam reservadas por este tempo (outros processos não reenviam)
+SHEETS_RETRY_BASE = 5.0
+SHEETS_RETRY_MAX = 60.0 * 30
+# Linhas recusadas/sem envio após tantas tentativas saem da fila para a tabela spool_failed (recuperação manual)
+SHEETS_MAX_ATTEMPTS = int(os.environ.get("CITATIA_SHEETS_MAX_ATTEMPTS", "12"))
+SHEETS_VERIFY_TTL = int(os.environ.get("CITATIA_SHEETS_VERIFY_TTL", "600"))
+SHEETS_VERIFY_NEGATIVE_TTL = int(os.environ.get("CITATIA_SHEETS_VERIFY_NEGATIVE_TTL", "30"))
+SHEETS_VERIFY_MAX_ENTRIES = 10000
+
+
+class SheetsWriter:
+    # Fila de cadastros em SQLite (sobrevive a reinícios); uma thread envia em lotes e reagenda as falhas
+    def __init__(self, path: str, session: requests.Session, metrics: Metrics, batch_size: int = SHEETS_BATCH_SIZE):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.session = session
+        self.metrics = metrics
+        self.batch_size = max(1, batch_size)
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, codigo TEXT NOT NULL, payload TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_spool_codigo ON spool(codigo)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spool_failed ("
+            "id INTEGER PRIMARY KEY, codigo TEXT NOT NULL, payload TEXT NOT NULL, attempts INTEGER NOT NULL, "
+            "failed_at REAL NOT NULL)"
+        )
+        self._thread = threading.Thread(target=self._run, name="citatia-sheets", daemon=True)
+        self._thread.start()
+
+    def submit(self, nome: str, email: str, codigo: str) -> None:
+        payload = json.dumps({"nome": nome, "email": email, "codigo": codigo}, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO spool (codigo, payload, next_attempt_at) VALUES (?, ?, ?)", (codigo, payload, time.time())
+            )
+            self.stats["submitted"] += 1
+        self._wakeup.set()
+
+    def is_pending(self, codigo: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM spool WHERE codigo = ? LIMIT 1", (codigo,)).fetchone() is not None
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def stats_snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "pending": self._conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]}
+
+    def _claim(self):
+        # Reserva um lote de linhas vencidas; BEGIN IMMEDIATE serializa com outros processos no mesmo spool
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, payload, attempts FROM spool WHERE next_attempt_at <= ? ORDER BY id LIMIT ?",
+                    (now, self.batch_size),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE spool SET next_attempt_at = ? WHERE id = ?", [(now + SHEETS_LEASE, r[0]) for r in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def _send(self, rows) -> bool:
+        records = [json.loads(r[1]) for r in rows]
+        body = records[0] if len(records) == 1 else {"rows": records}
+        try:
+            with self.metrics.span("sheets_request", op="save"):
+                response = self.session.post(
+                    URL_GOOGLE_SHEETS, json=body, headers={"Content-Type": "application/json"}, timeout=HTTP_TIMEOUT
+                )
+        except requests.RequestException as exc:
+            logger.warning("Google Sheets indisponível (%d linhas no spool): %s", len(rows), exc)
+            return False
+        if response.text.strip() != "Sucesso":
+            logger.warning("Google Sheets recusou o lote: %s", response.text[:200])
+            return False
+        return True
+
+    def flush(self) -> int:
+        # Envia tudo o que está vencido; retorna o número de linhas gravadas
+        written = 0
+        while True:
+            rows = self._claim()
+            if not rows:
+                return written
+            ids = [(r[0],) for r in rows]
+            if self._send(rows):
+                with self._lock:
+                    self._conn.executemany("DELETE FROM spool WHERE id = ?", ids)
+                    self.stats["written"] += len(rows)
+                    self.stats["batches"] += 1
+                written += len(rows)
+                continue
+            now = time.time()
+            exhausted = [(row_id,) for row_id, _, attempts in rows if attempts + 1 >= SHEETS_MAX_ATTEMPTS]
+            with self._lock:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "UPDATE spool SET attempts = attempts + 1, next_attempt_at = ? WHERE id = ?",
+                    [
+                        (now + random.uniform(0, min(SHEETS_RETRY_MAX, SHEETS_RETRY_BASE * 2 ** attempts)), row_id)
+                        for row_id, _, attempts in rows
+                    ],
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO spool_failed (id, codigo, payload, attempts, failed_at) "
+                    "SELECT id, codigo, payload, attempts, ? FROM spool WHERE id = ?",
+                    [(now, row_id) for (row_id,) in exhausted],
+                )
+                self._conn.executemany("DELETE FROM spool WHERE id = ?", exhausted)
+                self._conn.execute("COMMIT")
+                self.stats["failed_batches"] += 1
+                self.stats["dropped"] += len(exhausted)
+            if exhausted:
+                logger.error(
+                    "%d linha(s) desistidas após %d tentativas; mantidas em spool_failed (%s)",
+                    len(exhausted), SHEETS_MAX_ATTEMPTS, self.path,
+                )
+            return written
+
+    def _run(self) -> None:
+        while True:
+            # Espera um pouco após o primeiro cadastro para juntar a rajada num único POST
+            if self._wakeup.wait(SHEETS_FLUSH_INTERVAL):
+                time.sleep(SHEETS_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as exc:
+                logger.warning("Falha ao ler o spool do Google Sheets: %s", exc)
+
+
+class TTLCache:
+    # Resultados com validade própria por entrada (ex.: negativos expiram antes dos positivos)
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.stats = Counter()
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                self._data.pop(key, None)
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            return entry[0]
+
+    def set(self, key: str, value, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+@process_resource
+def get_sheets_writer() -> SheetsWriter:
+    metrics = get_metrics()
+    writer = SheetsWriter(SHEETS_SPOOL_PATH, get_http_session(), metrics)
+    metrics.register("sheets", writer.stats_snapshot, gauges=("pending",))
+    return writer
+
+
+@process_resource
+def get_verification_cache() -> TTLCache:
+    cache = TTLCache(SHEETS_VERIFY_MAX_ENTRIES)
+    get_metrics().register("verification_cache", lambda: dict(cache.stats))
+    return cache
+
+
 def salvar_email_google_sheets(nome: str, email: str, codigo_verificacao: str) -> None:
+    # Grava no spool local e retorna na hora; o envio ao Apps Script acontece em segundo plano
     try:
-        response = requests.post(
-            URL_GOOGLE_SHEETS,
-            json={"nome": nome, "email": email, "codigo": codigo_verificacao},
-            headers={"Content-Type": "application/json"},
-            timeout=20,
-        )
-        if response.text.strip() == "Sucesso":
-            st.success("✅ E-mail, nome e código registrados com sucesso!")
-        else:
-            st.error(f"❌ Erro ao salvar dados no Google Sheets: {response.text}")
-    except requests.RequestException as exc:
-        st.error(f"❌ Erro na conexão com o Google Sheets: {exc}")
+        get_sheets_writer().submit(nome, email, codigo_verificacao)
+    except sqlite3.Error as exc:
+        st.error(f"❌ Erro ao registrar os dados: {exc}")
+        return
+    get_verification_cache().discard(codigo_verificacao)
+    st.success("✅ E-mail, nome e código registrados com sucesso!")
 
 
 def verificar_codigo_google_sheets(codigo_digitado: str) -> bool:
+    # Cadastro ainda no spool já é válido; o resto passa por um cache com TTL curto para "inválido"
+    if get_sheets_writer().is_pending(codigo_digitado):
+        return True
+    cache = get_verification_cache()
+    valid = cache.get(codigo_digitado)
+    if valid is not None:
+        return valid
     try:
-        response = requests.get(f"{URL_GOOGLE_SHEETS}?codigo={codigo_digitado}", timeout=20)
-        return response.text.strip() == "Valido"
+        with get_metrics().span("sheets_request", op="verify"):
+            response = get_http_session().get(
+                URL_GOOGLE_SHEETS, params={"codigo": codigo_digitado}, timeout=HTTP_TIMEOUT
+            )
     except requests.RequestException as exc:
         st.error(f"❌ Erro na conexão com o Google Sheets: {exc}")
         return False
+    valid = response.text.strip() == "Valido"
+    cache.set(codigo_digitado, valid, SHEETS_VERIFY_TTL if valid else SHEETS_VERIFY_NEGATIVE_TTL)
+    return valid
 
 
 def gerar_codigo_verificacao(texto: str) -> str:
@@ -101,10 +891,91 @@ def gerar_codigo_verificacao(texto: str) -> str:
 # =========================
 # UTILIDADES
 # =========================
+WORD_RE = re.compile(r"\b\w+\b")
+
+
+def tokenize(text: str):
+    return WORD_RE.findall((text or "").lower())
+
+
+def filter_keywords(words):
+    return [w for w in words if w not in STOP_WORDS and len(w) > 3 and not w.isdigit()]
+
+
+def tokenize_keywords(text: str):
+    return filter_keywords(tokenize(text))
+
+
+def build_area_index(area_keywords: dict) -> dict:
+    # Índice invertido palavra -> áreas: classificar custa O(tokens), não O(áreas)
+    index = defaultdict(list)
+    for area, keywords in area_keywords.items():
+        for word in keywords:
+            index[word].append(area)
+    return {word: tuple(areas) for word, areas in index.items()}
+
+
+AREA_TOKEN_INDEX = build_area_index(AREA_KEYWORDS)
+AREA_ORDER = {area: i for i, area in enumerate(AREA_KEYWORDS)}
+
+
+def infer_areas_from_words(words):
+    matched = {area for word in set(words) for area in AREA_TOKEN_INDEX.get(word, ())}
+    # Mesma ordem de AREA_KEYWORDS (a primeira área define a baseline do artigo)
+    return sorted(matched, key=AREA_ORDER.__getitem__) if matched else ["Multidisciplinary"]
+
+
 def infer_areas_from_text(texto: str):
-    words = set(re.findall(r"\b\w+\b", (texto or "").lower()))
-    matched = [area for area, kws in AREA_KEYWORDS.items() if words.intersection(kws)]
-    return matched if matched else ["Multidisciplinary"]
+    return infer_areas_from_words(tokenize(texto))
+
+
+@dataclass(slots=True)
+class Article:
+    # Registro compacto: sem dict por artigo, sem "phrase" duplicando o resumo, strings repetidas
+    # (fonte, editora, áreas) internadas e compartilhadas entre todos os artigos do processo
+    title: str
+    abstract: str
+    doi: str
+    link: str
+    citation_count: int
+    year: int  # None = ano desconhecido
+    areas: tuple
+    source: str
+    publisher: str
+    token_counts: Counter = field(default=None, compare=False, repr=False)
+
+    def __post_init__(self):
+        self.source = sys.intern(self.source or "N/A")
+        self.publisher = sys.intern(self.publisher or "N/A")
+        self.areas = tuple(sys.intern(a) for a in self.areas)
+
+    @property
+    def phrase(self) -> str:
+        return f"{self.title}. {self.abstract}"
+
+    def to_row(self) -> list:
+        # Serialização do cache: lista posicional (sem repetir nomes de campos em cada artigo)
+        return [self.title, self.abstract, self.doi, self.link, self.citation_count, self.year,
+                list(self.areas), self.source, self.publisher]
+
+    @classmethod
+    def from_row(cls, row) -> "Article":
+        return cls(*row)
+
+
+def articles_to_rows(articles):
+    return [a.to_row() for a in articles]
+
+
+def articles_from_rows(rows):
+    return [Article.from_row(r) for r in rows]
+
+
+def article_token_counts(article: Article):
+    # Contagem de palavras-chave do artigo, tokenizada sob demanda uma única vez e guardada no registro
+    if article.token_counts is None:
+        article.token_counts = Counter(tokenize_keywords(article.phrase))
+    return article.token_counts
 
 
 def get_year_from_crossref(item: dict):
@@ -119,222 +990,1364 @@ def strip_html(txt: str) -> str:
     return re.sub(r"<[^>]+>", " ", txt or "")
 
 
-def extract_text_from_pdf_bytes(pdf_bytes: bytes) -> str:
-    if not pdf_bytes:
+def current_rss_bytes() -> int:
+    # RSS atual do processo (Linux); 0 onde /proc não existe, o que desliga o orçamento de memória
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _open_pdf(source):
+    # source = caminho (upload em disco, lote) ou bytes; caminho evita cópias do arquivo em memória
+    import pdfplumber
+
+    if isinstance(source, (str, os.PathLike)):
+        return pdfplumber.open(source)
+    return pdfplumber.open(BytesIO(source))
+
+
+@functools.lru_cache(maxsize=64)
+def _file_digest(path: str, size: int, mtime_ns: int) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_BYTES):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def pdf_digest(source) -> str:
+    if isinstance(source, (str, os.PathLike)):
+        stat = os.stat(source)
+        return _file_digest(os.fspath(source), stat.st_size, stat.st_mtime_ns)
+    return hashlib.sha256(source).hexdigest()
+
+
+def pdf_size(source) -> int:
+    return os.path.getsize(source) if isinstance(source, (str, os.PathLike)) else len(source)
+
+
+def spool_upload(fileobj) -> str:
+    # Copia o upload em blocos para um arquivo temporário: a extração lê do disco, sem getvalue()
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    fileobj.seek(0)
+    with tempfile.NamedTemporaryFile(dir=UPLOAD_DIR, suffix=".pdf", delete=False) as out:
+        while chunk := fileobj.read(UPLOAD_CHUNK_BYTES):
+            out.write(chunk)
+    return out.name
+
+
+def discard_upload(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _iter_page_texts(pages):
+    # Fecha cada página logo após extrair o texto (libera objetos de layout e o cache do textmap) e
+    # interrompe a extração se o RSS crescer além do orçamento desde o início dela: o RSS absoluto
+    # inclui o resto do servidor e, passado o limite, truncaria toda extração na primeira página
+    budget = PDF_RSS_BUDGET_MB * 1024 * 1024
+    baseline = current_rss_bytes() if budget else 0
+    for i, page in enumerate(pages):
+        try:
+            text = page.extract_text() or ""
+        finally:
+            page.close()
+        yield text
+        if budget and current_rss_bytes() - baseline > budget:
+            logger.warning("Orçamento de memória do PDF (%d MB) excedido após %d páginas", PDF_RSS_BUDGET_MB, i + 1)
+            return
+
+
+def _extract_page_range(source, start: int, stop: int):
+    # Executado nos processos do pool: cada worker abre o documento e extrai só a sua faixa
+    with _open_pdf(source) as pdf:
+        return list(_iter_page_texts(pdf.pages[start:stop]))
+
+
+def _extract_pages_parallel(source, n_pages: int):
+    shard = max(math.ceil(n_pages / (PDF_WORKERS * 2)), 1)
+    ranges = [(start, min(start + shard, n_pages)) for start in range(0, n_pages, shard)]
+    try:
+        executor = get_pdf_executor()
+        futures = [executor.submit(_extract_page_range, source, start, stop) for start, stop in ranges]
+        pages = []
+        for (start, stop), future in zip(ranges, futures):
+            texts = future.result()
+            pages.extend(texts)
+            if len(texts) < stop - start:
+                # Faixa interrompida pelo orçamento: as seguintes deixariam um buraco no meio do texto,
+                # então o resultado é o prefixo contíguo (o chamador vê menos páginas que n_pages)
+                for pending in futures:
+                    pending.cancel()
+                break
+        return pages
+    except (BrokenProcessPool, pickle.PicklingError, OSError):
+        # Pool indisponível (ex.: processo morto por OOM): recria na próxima chamada e segue em série
+        get_pdf_executor.clear()
+        return _extract_page_range(source, 0, n_pages)
+
+
+def iter_pdf_pages(source, max_pages: int = 0):
+    # Gerador: cada página só é extraída quando o consumidor pede a próxima
+    with _open_pdf(source) as pdf:
+        pages = pdf.pages[:max_pages] if max_pages else pdf.pages
+        yield from _iter_page_texts(pages)
+
+
+def extract_theme_sample(
+    source,
+    max_pages: int = None,
+    max_chars: int = None,
+    stable_pages: int = None,
+) -> str:
+    if not source:
+        return ""
+    max_pages = THEME_SAMPLE_MAX_PAGES if max_pages is None else max_pages
+    max_chars = THEME_SAMPLE_MAX_CHARS if max_chars is None else max_chars
+    stable_pages = THEME_SAMPLE_STABLE_PAGES if stable_pages is None else stable_pages
+
+    cache = get_pdf_text_cache()
+    key = f"{pdf_digest(source)}:sample:{max_pages}:{max_chars}:{stable_pages}"
+    hit = cache.get(key)
+    if hit is not None:
+        return hit[0]
+
+    chunks = []
+    chars = 0
+    counts = Counter()
+    previous_top = None
+    stable = 0
+    truncated = False
+    try:
+        with _open_pdf(source) as pdf:
+            pages = pdf.pages[:max_pages] if max_pages else pdf.pages
+            with closing(_iter_page_texts(pages)) as texts:
+                for page_text in texts:
+                    chunks.append(page_text)
+                    chars += len(page_text)
+                    counts.update(tokenize_keywords(page_text))
+                    top = {w for w, _ in counts.most_common(THEME_TOP_N)}
+                    stable = stable + 1 if top and top == previous_top else 0
+                    previous_top = top
+                    # Early exit: orçamento de caracteres esgotado ou top-N inalterado por N páginas seguidas
+                    if chars >= max_chars or (chars >= THEME_SAMPLE_MIN_CHARS and stable >= stable_pages):
+                        break
+                else:
+                    # Sem early exit e com menos páginas que o documento: parada pelo orçamento de memória
+                    truncated = len(chunks) < len(pages)
+    except Exception:
+        return ""
+
+    metrics = get_metrics()
+    metrics.incr("pdf_pages", len(chunks), mode="sample")
+    text = "\n".join(chunks).strip()
+    if truncated:
+        metrics.incr("pdf_budget_stops")
+    else:
+        cache.set(key, text)
+    return text
+
+
+def extract_text_from_pdf(source, max_pages: int = None) -> str:
+    if not source:
         return ""
-    text = []
+    max_pages = PDF_MAX_PAGES if max_pages is None else max_pages
+
+    cache = get_pdf_text_cache()
+    key = f"{pdf_digest(source)}:{max_pages}"
+    hit = cache.get(key)
+    if hit is not None:
+        return hit[0]
+
     try:
-        with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
-            for page in pdf.pages:
-                text.append(page.extract_text() or "")
+        with _open_pdf(source) as pdf:
+            n_pages = min(len(pdf.pages), max_pages) if max_pages else len(pdf.pages)
+            if PDF_WORKERS > 1 and n_pages >= PDF_PARALLEL_MIN_PAGES:
+                pages = None
+            else:
+                pages = list(_iter_page_texts(pdf.pages[:n_pages]))
+        if pages is None:
+            pages = _extract_pages_parallel(source, n_pages)
     except Exception:
         return ""
-    return "\n".join(text).strip()
+
+    metrics = get_metrics()
+    metrics.incr("pdf_pages", len(pages), mode="full")
+    text = "\n".join(pages).strip()
+    if len(pages) < n_pages:
+        metrics.incr("pdf_budget_stops")
+    else:
+        cache.set(key, text)
+    return text
+
+
+# Nome anterior (recebia só bytes); mantido para quem importa o app como biblioteca
+extract_text_from_pdf_bytes = extract_text_from_pdf
 
 
 def identify_theme(user_text: str):
-    words = re.findall(r"\b\w+\b", (user_text or "").lower())
-    words = [w for w in words if w not in STOP_WORDS and len(w) > 3 and not w.isdigit()]
-    top = Counter(words).most_common(12)
+    top = Counter(tokenize_keywords(user_text)).most_common(THEME_TOP_N)
     tema = ", ".join([w for w, _ in top]) if top else "Tema não identificado"
     return tema, [w for w, _ in top]
 
 
-@st.cache_data(ttl=60 * 30, show_spinner=False)  # 30 min
-def get_popular_phrases(query: str, limit: int = 60):
-    articles = []
+SEMANTIC_FIELDS = "title,abstract,url,externalIds,citationCount,year,fieldsOfStudy,venue"
+CROSSREF_SORT = {"sort": "is-referenced-by-count", "order": "desc"}
+
+# Modo profundo: paginação até N registros
+DEEP_CORPUS_DEFAULT = int(os.environ.get("CITATIA_DEEP_DEFAULT", "1000"))
+DEEP_CORPUS_MAX = int(os.environ.get("CITATIA_DEEP_MAX", "5000"))
+SEMANTIC_PAGE_SIZE = 100  # máximo por página em /paper/search
+SEMANTIC_MAX_RESULTS = 1000  # /paper/search não pagina além de offset + limit = 1000
+CROSSREF_PAGE_SIZE = 1000  # máximo de rows por página com cursor
+
+
+def semantic_scholar_record(item: dict) -> Article:
+    title = item.get("title", "") or ""
+    abstract = item.get("abstract") or ""
+    return Article(
+        title=title,
+        abstract=abstract,
+        doi=(item.get("externalIds") or {}).get("DOI", "N/A"),
+        link=item.get("url", "N/A"),
+        citation_count=int(item.get("citationCount", 0) or 0),
+        year=item.get("year"),
+        areas=item.get("fieldsOfStudy") or infer_areas_from_text(f"{title} {abstract}"),
+        source=item.get("venue") or "N/A",
+        publisher="Semantic Scholar",
+    )
 
-    # Semantic Scholar
-    semantic_params = {
-        "query": query,
-        "limit": limit,
-        "fields": "title,abstract,url,externalIds,citationCount,year,fieldsOfStudy,venue",
-    }
+
+def crossref_record(item: dict) -> Article:
+    title = (item.get("title") or [""])[0] or ""
+    abstract = strip_html(item.get("abstract", "") or "")
+    return Article(
+        title=title,
+        abstract=abstract,
+        doi=item.get("DOI", "N/A"),
+        link=item.get("URL", "N/A"),
+        citation_count=int(item.get("is-referenced-by-count", 0) or 0),
+        year=get_year_from_crossref(item),
+        areas=item.get("subject") or infer_areas_from_text(f"{title} {abstract}"),
+        source=(item.get("container-title") or ["N/A"])[0],
+        publisher=item.get("publisher", "N/A"),
+    )
+
+
+# Fetchers retornam None quando a fonte falhou (após as novas tentativas), [] quando não há resultados
+def fetch_semantic_scholar(client: HttpClient, query: str, limit: int):
+    params = {"query": query, "limit": limit, "fields": SEMANTIC_FIELDS}
     try:
-        resp = requests.get(SEMANTIC_API, params=semantic_params, timeout=20)
-        if resp.status_code == 200:
-            for item in resp.json().get("data", []):
-                title = item.get("title", "") or ""
-                abstract = item.get("abstract") or ""
-                venue = item.get("venue") or "N/A"
-                articles.append(
-                    {
-                        "title": title,
-                        "abstract": abstract,
-                        "phrase": f"{title}. {abstract}",
-                        "doi": (item.get("externalIds") or {}).get("DOI", "N/A"),
-                        "link": item.get("url", "N/A"),
-                        "citationCount": int(item.get("citationCount", 0) or 0),
-                        "year": item.get("year"),
-                        "areas": item.get("fieldsOfStudy") or infer_areas_from_text(f"{title} {abstract}"),
-                        "source": venue,
-                        "publisher": "Semantic Scholar",
-                    }
-                )
+        with client.metrics.span("fetch_source", source="semantic_scholar"):
+            resp = client.get(SEMANTIC_API, params=params)
+            if resp.status_code == 200:
+                return [semantic_scholar_record(item) for item in resp.json().get("data", [])]
     except requests.RequestException:
         pass
+    return None
+
 
-    # Crossref
-    crossref_params = {"query": query, "rows": limit, "sort": "is-referenced-by-count", "order": "desc"}
+def fetch_crossref(client: HttpClient, query: str, limit: int):
+    params = {"query": query, "rows": limit, **CROSSREF_SORT}
     try:
-        resp = requests.get(CROSSREF_API, params=crossref_params, headers=CROSSREF_HEADERS, timeout=20)
-        if resp.status_code == 200:
-            for item in resp.json().get("message", {}).get("items", []):
-                title = (item.get("title") or [""])[0] or ""
-                abstract = strip_html(item.get("abstract", "") or "")
-                source = (item.get("container-title") or ["N/A"])[0]
-                articles.append(
-                    {
-                        "title": title,
-                        "abstract": abstract,
-                        "phrase": f"{title}. {abstract}",
-                        "doi": item.get("DOI", "N/A"),
-                        "link": item.get("URL", "N/A"),
-                        "citationCount": int(item.get("is-referenced-by-count", 0) or 0),
-                        "year": get_year_from_crossref(item),
-                        "areas": item.get("subject") or infer_areas_from_text(f"{title} {abstract}"),
-                        "source": source,
-                        "publisher": item.get("publisher", "N/A"),
-                    }
-                )
+        with client.metrics.span("fetch_source", source="crossref"):
+            resp = client.get(CROSSREF_API, params=params, headers=CROSSREF_HEADERS)
+            if resp.status_code == 200:
+                return [crossref_record(item) for item in resp.json().get("message", {}).get("items", [])]
     except requests.RequestException:
         pass
+    return None
+
 
-    # Dedup
-    dedup = {}
-    for art in articles:
-        key = art["doi"] if art["doi"] != "N/A" else art["title"].strip().lower()
-        if not key:
+# Iteradores de páginas: entregam None (e param) quando a fonte falha; páginas anteriores continuam válidas
+def iter_semantic_scholar_pages(client: HttpClient, query: str, max_records: int):
+    # Paginação por offset; cada página é convertida em registros e o JSON bruto é descartado
+    offset = 0
+    cap = min(max_records, SEMANTIC_MAX_RESULTS)
+    while offset < cap:
+        params = {"query": query, "offset": offset, "limit": min(SEMANTIC_PAGE_SIZE, cap - offset), "fields": SEMANTIC_FIELDS}
+        try:
+            resp = client.get(SEMANTIC_API, params=params)
+            if resp.status_code != 200:
+                yield None
+                return
+            payload = resp.json()
+        except requests.RequestException:
+            yield None
+            return
+        data = payload.get("data") or []
+        if not data:
+            return
+        yield [semantic_scholar_record(item) for item in data]
+        offset += len(data)
+        if payload.get("next") is None:
+            return
+
+
+def iter_crossref_pages(client: HttpClient, query: str, max_records: int):
+    # Paginação por cursor (deep paging recomendado pelo Crossref para além de 10k offsets)
+    cursor = "*"
+    fetched = 0
+    while cursor and fetched < max_records:
+        params = {"query": query, "rows": min(CROSSREF_PAGE_SIZE, max_records - fetched), "cursor": cursor, **CROSSREF_SORT}
+        try:
+            resp = client.get(CROSSREF_API, params=params, headers=CROSSREF_HEADERS)
+            if resp.status_code != 200:
+                yield None
+                return
+            message = resp.json().get("message", {})
+        except requests.RequestException:
+            yield None
+            return
+        items = message.get("items") or []
+        if not items:
+            return
+        yield [crossref_record(item) for item in items]
+        fetched += len(items)
+        cursor = message.get("next-cursor")
+
+
+# Ordem = prioridade no desempate do dedup (mesmo comportamento da versão sequencial)
+LITERATURE_SOURCES = (fetch_semantic_scholar, fetch_crossref)
+DEEP_LITERATURE_SOURCES = (iter_semantic_scholar_pages, iter_crossref_pages)
+
+
+# Quase-duplicatas (preprint x versão publicada, variações de pontuação entre S2 e Crossref):
+# MinHash dos 4-gramas de caracteres do título normalizado + LSH por bandas, custo linear no corpus
+NEAR_DUP_THRESHOLD = float(os.environ.get("CITATIA_NEAR_DUP_THRESHOLD", "0.85"))  # Jaccard estimado
+NEAR_DUP_MIN_TITLE_CHARS = 25  # títulos curtos ("Editorial", "Introduction") só casam por igualdade exata sem DOI
+NEAR_DUP_MAX_YEAR_GAP = 2
+MINHASH_PERMUTATIONS = 128
+MINHASH_BANDS = 16  # 16 bandas x 8 linhas: Jaccard 0,85 vira candidato com prob. 0,994; Jaccard 0,3 com 0,001
+MINHASH_SHINGLE = 4
+MINHASH_CHUNK = 256  # títulos por lote vetorizado (limita a matriz shingles x permutações)
+# DOIs diferentes dos dois lados = trabalhos diferentes ("... Part 1" x "... Part 2"), por mais parecido
+# que seja o título; a única exceção é preprint x versão publicada (um DOI de servidor de preprint e outro não)
+PREPRINT_DOI_PREFIXES = ("10.48550/", "10.1101/", "10.2139/", "10.21203/", "10.20944/", "10.31219/")
+_MINHASH_RNG = np.random.default_rng(20240601)
+_MINHASH_A = _MINHASH_RNG.integers(1, 2**63, MINHASH_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_MINHASH_B = _MINHASH_RNG.integers(0, 2**63, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_LSH_MIX = _MINHASH_RNG.integers(1, 2**63, MINHASH_PERMUTATIONS // MINHASH_BANDS, dtype=np.uint64) | np.uint64(1)
+_NON_ALNUM_RE = re.compile(r"[^0-9a-z]+")
+# Marcadores de série em títulos normalizados ("part 2", "vol iii", número final): títulos quase iguais
+# com marcadores diferentes são obras diferentes ("... Part 1" x "... Part 2"), com ou sem DOI
+_TITLE_PART_RE = re.compile(r"\b(?:part|parte|pt|vol|volume|chapter|capitulo|section|secao)\s+(\d+|[ivxlc]+|[a-z])\b")
+_TITLE_TRAILING_NUMBER_RE = re.compile(r"\s(\d+|[ivx]+)$")
+
+
+def normalize_title(title: str) -> str:
+    # Sem acentos, caixa, pontuação nem espaços repetidos
+    folded = unicodedata.normalize("NFKD", title or "").encode("ascii", "ignore").decode("ascii")
+    return _NON_ALNUM_RE.sub(" ", folded.lower()).strip()
+
+
+def title_sequence_marks(title: str) -> tuple:
+    marks = _TITLE_PART_RE.findall(title)
+    trailing = _TITLE_TRAILING_NUMBER_RE.search(title)
+    if trailing:
+        marks.append(trailing.group(1))
+    return tuple(marks)
+
+
+def minhash_signatures(texts):
+    # Assinaturas (len(texts) x permutações) de textos com pelo menos MINHASH_SHINGLE bytes.
+    # Todos os textos de um lote ficam num único buffer: shingles de 4 bytes viram inteiros por janela
+    # deslizante, janelas que cruzam a fronteira entre textos são descartadas e o mínimo por texto sai
+    # de um reduceat, sem laço Python por título. Hash por permutação: multiply-shift em uint64.
+    signatures = np.empty((len(texts), MINHASH_PERMUTATIONS), dtype=np.uint32)
+    for chunk_start in range(0, len(texts), MINHASH_CHUNK):
+        encoded = [t.encode("utf-8") for t in texts[chunk_start:chunk_start + MINHASH_CHUNK]]
+        lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=len(encoded))
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+        windows = len(data) - MINHASH_SHINGLE + 1
+        codes = np.zeros(windows, dtype=np.uint64)
+        for offset in range(MINHASH_SHINGLE):
+            codes = (codes << np.uint64(8)) | data[offset:offset + windows]
+        ends = np.cumsum(lengths)
+        crossing = (ends[:-1, None] - np.arange(1, MINHASH_SHINGLE)[None, :]).ravel()
+        keep = np.ones(windows, dtype=bool)
+        keep[crossing] = False
+        codes = codes[keep]
+        offsets = np.concatenate(([0], np.cumsum(lengths - MINHASH_SHINGLE + 1)[:-1]))
+        # permutações x shingles: o reduceat corre sobre linhas contíguas
+        hashed = (_MINHASH_A[:, None] * codes[None, :] + _MINHASH_B[:, None]) >> np.uint64(32)
+        signatures[chunk_start:chunk_start + len(encoded)] = np.minimum.reduceat(hashed, offsets, axis=1).T
+    return signatures
+
+
+def lsh_bands(signatures):
+    # Uma chave inteira por banda (combinação linear das linhas da banda, com overflow de uint64)
+    rows = signatures.reshape(len(signatures), MINHASH_BANDS, -1).astype(np.uint64)
+    return (rows * _LSH_MIX).sum(axis=2, dtype=np.uint64)
+
+
+class DedupIndex:
+    # canônica -> (rank, artigo); DOI e título normalizado apontam para a entrada canônica;
+    # bandas LSH guardam as assinaturas de todas as versões já vistas de cada entrada
+    def __init__(self, threshold: float = NEAR_DUP_THRESHOLD):
+        self.threshold = threshold
+        self.entries = {}
+        self.stats = Counter()
+        self._aliases = {}
+        self._dois = {}  # canônica -> DOIs (minúsculos) das versões já fundidas
+        self._signatures = {}  # canônica -> [(marcadores de série, assinatura)] das versões vistas
+        self._buckets = defaultdict(dict)  # banda -> {canônica: None} (conjunto com ordem de inserção)
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def _years_compatible(a: Article, b: Article) -> bool:
+        if not isinstance(a.year, int) or not isinstance(b.year, int):
+            return True
+        return abs(a.year - b.year) <= NEAR_DUP_MAX_YEAR_GAP
+
+    def _dois_conflict(self, doi: str, canonical) -> bool:
+        # Só chamado sem casamento exato de DOI: qualquer DOI já fundido do mesmo tipo (preprint ou não) diverge
+        if doi == "N/A":
+            return False
+        preprint = doi.lower().startswith(PREPRINT_DOI_PREFIXES)
+        return any(other.startswith(PREPRINT_DOI_PREFIXES) == preprint for other in self._dois.get(canonical, ()))
+
+    def _find(self, art: Article, title: str, signature, bands):
+        if art.doi != "N/A":
+            canonical = self._aliases.get(("doi", art.doi.lower()))
+            if canonical is not None:
+                return canonical, "doi"
+        canonical = self._aliases.get(("title", title))
+        if canonical is not None and not self._dois_conflict(art.doi, canonical):
+            # Sem DOI dos dois lados: igualdade de título basta (comportamento anterior do dedup)
+            both_without_doi = art.doi == "N/A" and canonical[0] == "title"
+            long_enough = len(title) >= NEAR_DUP_MIN_TITLE_CHARS
+            if both_without_doi or (long_enough and self._years_compatible(art, self.entries[canonical][1])):
+                return canonical, "title"
+        if signature is None:
+            return None, None
+        marks = title_sequence_marks(title)
+        seen = set()
+        for band in bands:
+            for canonical in self._buckets.get(band, ()):
+                if canonical in seen:
+                    continue
+                seen.add(canonical)
+                if not self._years_compatible(art, self.entries[canonical][1]) or self._dois_conflict(art.doi, canonical):
+                    continue
+                # Só compara com versões da mesma parte/volume da série
+                versions = [other for other_marks, other in self._signatures[canonical] if other_marks == marks]
+                if not versions:
+                    continue
+                similarity = max(float(np.mean(signature == other)) for other in versions)
+                if similarity >= self.threshold:
+                    return canonical, "minhash"
+        return None, None
+
+    def add_many(self, articles, rank: int = 0) -> None:
+        titles = [normalize_title(art.title) for art in articles]
+        long_titles = [i for i, title in enumerate(titles) if len(title) >= NEAR_DUP_MIN_TITLE_CHARS]
+        signatures = [None] * len(titles)
+        bands = [None] * len(titles)
+        if long_titles:
+            batch = minhash_signatures([titles[i] for i in long_titles])
+            for i, signature, band_keys in zip(long_titles, batch, lsh_bands(batch).tolist()):
+                signatures[i] = signature
+                bands[i] = list(enumerate(band_keys))
+        for art, title, signature, band_keys in zip(articles, titles, signatures, bands):
+            self.add(art, rank, title, signature, band_keys)
+
+    def add(self, art: Article, rank: int = 0, title: str = None, signature=None, bands=None) -> None:
+        # title/assinatura/bandas já calculados por add_many; avulso, são calculados aqui
+        if title is None:
+            title = normalize_title(art.title)
+            if len(title) >= NEAR_DUP_MIN_TITLE_CHARS:
+                signature = minhash_signatures([title])[0]
+                bands = list(enumerate(lsh_bands(signature[None, :])[0].tolist()))
+        if art.doi == "N/A" and not title:
+            return
+        canonical, method = self._find(art, title, signature, bands)
+        if canonical is None:
+            canonical = ("doi", art.doi.lower()) if art.doi != "N/A" else ("title", title)
+            self.entries[canonical] = (rank, art)
+        else:
+            self.stats[method] += 1
+            current_rank, current = self.entries[canonical]
+            if art.citation_count > current.citation_count or (
+                art.citation_count == current.citation_count and rank < current_rank
+            ):
+                self.entries[canonical] = (rank, art)
+
+        if art.doi != "N/A":
+            self._aliases.setdefault(("doi", art.doi.lower()), canonical)
+            self._dois.setdefault(canonical, set()).add(art.doi.lower())
+        if title and (art.doi == "N/A" or len(title) >= NEAR_DUP_MIN_TITLE_CHARS):
+            self._aliases.setdefault(("title", title), canonical)
+        if signature is not None:
+            self._signatures.setdefault(canonical, []).append((title_sequence_marks(title), signature))
+            for band in bands:
+                self._buckets[band][canonical] = None
+
+
+def merge_articles(dedup: DedupIndex, articles, rank: int = 0) -> None:
+    dedup.add_many(list(articles), rank)
+
+
+def rank_merged_articles(dedup: DedupIndex, limit: int):
+    # As fontes chegam em paralelo (ordem variável): empates de citações e fonte se resolvem pela chave
+    # do artigo, senão o corte em limit muda de uma consulta para outra com as mesmas respostas
+    ranked = sorted(dedup.entries.values(), key=lambda x: (-x[1].citation_count, x[0], dump_item_key(x[1])))
+    return [art for _, art in ranked[:limit]]
+
+
+# =========================
+# ÍNDICE LOCAL (dumps Crossref / Semantic Scholar em SQLite FTS5)
+# =========================
+LOCAL_INDEX_PATH = os.environ.get("CITATIA_LOCAL_INDEX", os.path.join(CACHE_DIR, "index.sqlite3"))
+# "auto": índice local primeiro, rede se ele trouxer poucos resultados | "local" | "network"
+LITERATURE_BACKEND = os.environ.get("CITATIA_LITERATURE_BACKEND", "auto")
+# No modo "auto" o índice só dispensa a rede com ao menos esta fração do limite pedido (60 no modo
+# normal, N no profundo): corpus menor muda h-index e saturação, e o modo profundo pararia de paginar
+LOCAL_INDEX_MIN_FRACTION = min(max(float(os.environ.get("CITATIA_LOCAL_INDEX_MIN_FRACTION", "1.0")), 0.0), 1.0)
+LOCAL_INDEX_CANDIDATES = 10  # candidatos por BM25 = limite x fator, reordenados por citações
+LOCAL_INDEX_BATCH = 5000
+
+
+def dump_item_key(article: Article) -> str:
+    # Mesma chave de deduplicação de merge_articles
+    return article.doi.lower() if article.doi != "N/A" else article.title.strip().lower()
+
+
+def semantic_scholar_dump_item(item: dict) -> dict:
+    # Datasets em massa do S2 usam chaves minúsculas e s2fieldsofstudy; a API usa camelCase
+    if "citationcount" not in item and "externalids" not in item:
+        return item
+    fields = item.get("s2fieldsofstudy") or []
+    return {
+        "title": item.get("title"),
+        "abstract": item.get("abstract"),
+        "url": item.get("url"),
+        "externalIds": item.get("externalids") or {},
+        "citationCount": item.get("citationcount"),
+        "year": item.get("year"),
+        "fieldsOfStudy": list(dict.fromkeys(f["category"] for f in fields if f.get("category"))) or None,
+        "venue": item.get("venue"),
+    }
+
+
+def _open_dump(path: str):
+    if path.endswith(".gz"):
+        import gzip
+
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def iter_dump_records(path: str, fmt: str = "auto"):
+    # JSONL (opcionalmente .gz): um item por linha ou, como nos snapshots do Crossref, {"items": [...]}
+    with _open_dump(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            payload = json.loads(line)
+            items = payload.get("items") if isinstance(payload.get("items"), list) else [payload]
+            for item in items:
+                is_crossref = fmt == "crossref" or (fmt == "auto" and ("DOI" in item or "container-title" in item))
+                record = crossref_record(item) if is_crossref else semantic_scholar_record(semantic_scholar_dump_item(item))
+                if record.title:
+                    yield record
+
+
+class LocalLiteratureIndex:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS papers (
+                id INTEGER PRIMARY KEY, key TEXT NOT NULL UNIQUE, title TEXT NOT NULL, abstract TEXT NOT NULL,
+                doi TEXT NOT NULL, link TEXT NOT NULL, citations INTEGER NOT NULL, year INTEGER,
+                areas TEXT NOT NULL, source TEXT NOT NULL, publisher TEXT NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+                title, abstract, content='papers', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS papers_ai AFTER INSERT ON papers BEGIN
+                INSERT INTO papers_fts(rowid, title, abstract) VALUES (new.id, new.title, new.abstract);
+            END;
+            CREATE TRIGGER IF NOT EXISTS papers_ad AFTER DELETE ON papers BEGIN
+                INSERT INTO papers_fts(papers_fts, rowid, title, abstract) VALUES ('delete', old.id, old.title, old.abstract);
+            END;
+            CREATE TRIGGER IF NOT EXISTS papers_au AFTER UPDATE ON papers BEGIN
+                INSERT INTO papers_fts(papers_fts, rowid, title, abstract) VALUES ('delete', old.id, old.title, old.abstract);
+                INSERT INTO papers_fts(rowid, title, abstract) VALUES (new.id, new.title, new.abstract);
+            END;
+            """
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    def ingest(self, records, batch_size: int = LOCAL_INDEX_BATCH) -> int:
+        # Upsert em lotes; registro repetido (DOI ou título) fica com a versão de mais citações
+        sql = (
+            "INSERT INTO papers (key, title, abstract, doi, link, citations, year, areas, source, publisher) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET title = excluded.title, abstract = excluded.abstract, "
+            "doi = excluded.doi, link = excluded.link, citations = excluded.citations, year = excluded.year, "
+            "areas = excluded.areas, source = excluded.source, publisher = excluded.publisher "
+            "WHERE excluded.citations > papers.citations"
+        )
+        total = 0
+        batch = []
+
+        def write():
+            with self._lock:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(sql, batch)
+                self._conn.execute("COMMIT")
+
+        for art in records:
+            batch.append(
+                (
+                    dump_item_key(art),
+                    art.title,
+                    art.abstract,
+                    art.doi,
+                    art.link,
+                    art.citation_count,
+                    art.year,
+                    json.dumps(art.areas, ensure_ascii=False),
+                    art.source,
+                    art.publisher,
+                )
+            )
+            if len(batch) >= batch_size:
+                write()
+                total += len(batch)
+                batch = []
+        if batch:
+            write()
+            total += len(batch)
+        return total
+
+    def optimize(self) -> None:
+        with self._lock:
+            self._conn.execute("INSERT INTO papers_fts(papers_fts) VALUES ('optimize')")
+
+    def iter_articles(self):
+        # Conexão própria: a varredura completa não segura o lock das consultas
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            rows = conn.execute(
+                "SELECT title, abstract, doi, link, citations, year, areas, source, publisher FROM papers"
+            )
+            for title, abstract, doi, link, citations, year, areas, source, publisher in rows:
+                yield Article(title, abstract, doi, link, citations, year, json.loads(areas), source, publisher)
+        finally:
+            conn.close()
+
+    def search(self, query: str, limit: int):
+        # OR das palavras-chave; os melhores candidatos por BM25 são reordenados por citações,
+        # como o corpus das APIs (Crossref ordenado por citações, merge por citações)
+        terms = list(dict.fromkeys(filter_keywords(tokenize(query))))
+        if not terms:
+            return []
+        match = " OR ".join(f'"{t}"' for t in terms)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.title, p.abstract, p.doi, p.link, p.citations, p.year, p.areas, p.source, p.publisher "
+                "FROM (SELECT rowid, bm25(papers_fts) AS score FROM papers_fts WHERE papers_fts MATCH ? "
+                "ORDER BY score LIMIT ?) c JOIN papers p ON p.id = c.rowid "
+                "ORDER BY p.citations DESC, c.score LIMIT ?",
+                (match, limit * LOCAL_INDEX_CANDIDATES, limit),
+            ).fetchall()
+        return [
+            Article(title, abstract, doi, link, citations, year, json.loads(areas), source, publisher)
+            for title, abstract, doi, link, citations, year, areas, source, publisher in rows
+        ]
+
+
+@process_resource
+def get_local_index():
+    # None quando não há índice construído (python -m citatia index <dumps>); lido na inicialização
+    if LITERATURE_BACKEND == "network" or not os.path.exists(LOCAL_INDEX_PATH):
+        return None
+    return LocalLiteratureIndex(LOCAL_INDEX_PATH)
+
+
+def search_local_index(query: str, limit: int):
+    # Retorna a lista do índice local, ou None quando a rede deve ser consultada
+    index = get_local_index()
+    if index is None:
+        return None
+    metrics = get_metrics()
+    try:
+        with metrics.span("local_index_query"):
+            articles = index.search(query, limit)
+    except sqlite3.Error as exc:
+        logger.warning("Falha no índice local (%s): %s", LOCAL_INDEX_PATH, exc)
+        return None
+    # Dumps das duas fontes trazem a mesma obra em versões diferentes (preprint, DOI do Crossref)
+    dedup = DedupIndex()
+    merge_articles(dedup, articles)
+    articles = rank_merged_articles(dedup, limit)
+    for method, count in dedup.stats.items():
+        metrics.incr("dedup_merged", count, method=method)
+    metrics.incr("local_index_results", len(articles))
+    if LITERATURE_BACKEND == "local" or len(articles) >= max(math.ceil(limit * LOCAL_INDEX_MIN_FRACTION), 1):
+        return articles
+    return None
+
+
+def fetch_popular_phrases(query: str, limit: int = 60, client=None, executor=None):
+    # Retorna (artigos, completo); completo=False quando alguma fonte falhou
+    client = client or get_http_client()
+    executor = executor or get_fetch_executor()
+
+    # Fontes em paralelo: o tempo total é limitado pela fonte mais lenta, não pela soma
+    futures = {executor.submit(fetch, client, query, limit): rank for rank, fetch in enumerate(LITERATURE_SOURCES)}
+    dedup = DedupIndex()
+    complete = True
+    for future in as_completed(futures):
+        articles = future.result()
+        if articles is None:
+            complete = False
             continue
-        if key not in dedup or art["citationCount"] > dedup[key]["citationCount"]:
-            dedup[key] = art
+        merge_articles(dedup, articles, futures[future])
+
+    for method, count in dedup.stats.items():
+        client.metrics.incr("dedup_merged", count, method=method)
+    return rank_merged_articles(dedup, limit), complete
+
+
+def literature_corpus(query: str, limit: int = 60):
+    # (artigos, completo): índice local e cache só guardam corpora completos; completo=False = alguma
+    # fonte falhou nesta consulta (o chamador não deve memoizar o que calcular em cima dele)
+    local = search_local_index(query, limit)
+    if local is not None:
+        return local, True
+
+    cache = get_literature_cache()
+    key = literature_cache_key(query, limit)
+    hit = cache.get(key)
+    if hit is not None:
+        rows, age = hit
+        if age > cache.ttl:
+            client, executor = get_http_client(), get_fetch_executor()
+
+            def refresh():
+                fresh, complete = fetch_popular_phrases(query, limit, client, executor)
+                if not (fresh and complete):
+                    return None
+                record_field_baselines(fresh)
+                return articles_to_rows(fresh)
+
+            cache.refresh_async(key, refresh)
+        return articles_from_rows(rows), True
+
+    articles, complete = fetch_popular_phrases(query, limit)
+    # Corpus vazio ou parcial (fonte fora do ar / 429 persistente) não é persistido
+    if articles and complete:
+        cache.set(key, articles_to_rows(articles))
+        record_field_baselines(articles)
+    return articles, complete
 
-    ranked = sorted(dedup.values(), key=lambda x: x.get("citationCount", 0), reverse=True)
-    return ranked[:limit]
+
+def get_popular_phrases(query: str, limit: int = 60):
+    return literature_corpus(query, limit)[0]
+
+
+def stream_deep_corpus(query: str, max_records: int, client=None, executor=None):
+    # Gerador: a cada página recebida (de qualquer fonte) entrega (corpus deduplicado parcial, completo);
+    # completo=False a partir do momento em que alguma fonte falhou
+    client = client or get_http_client()
+    executor = executor or get_deep_fetch_executor()
+    pages = queue.Queue(maxsize=len(DEEP_LITERATURE_SOURCES) * 2)  # limita páginas em memória
+    stop = threading.Event()
+    done = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce(rank, iter_pages):
+        try:
+            for page in iter_pages(client, query, max_records):
+                if not put((rank, page)):
+                    return
+        except Exception:
+            logger.exception("Fonte %d do modo profundo falhou", rank)
+            put((rank, None))
+        finally:
+            pages.put((rank, done))
+
+    for rank, iter_pages in enumerate(DEEP_LITERATURE_SOURCES):
+        executor.submit(produce, rank, iter_pages)
+
+    dedup = DedupIndex()
+    pending = len(DEEP_LITERATURE_SOURCES)
+    complete = True
+    try:
+        while pending:
+            rank, page = pages.get()
+            if page is done:
+                pending -= 1
+                continue
+            if page is None:
+                complete = False
+                client.metrics.incr("deep_source_failures", rank=rank)
+            else:
+                merge_articles(dedup, page, rank)
+            yield rank_merged_articles(dedup, max_records), complete
+    finally:
+        for method, count in dedup.stats.items():
+            client.metrics.incr("dedup_merged", count, method=method)
+        # Consumidor encerrou cedo: libera os produtores bloqueados na fila
+        stop.set()
+        while pending:
+            try:
+                if pages.get(timeout=0.5)[1] is done:
+                    pending -= 1
+            except queue.Empty:
+                continue
+
+
+def deep_literature_corpus(query: str, max_records: int = DEEP_CORPUS_DEFAULT, on_progress=None):
+    # (artigos, completo), como literature_corpus, no modo profundo
+    max_records = max(1, min(max_records, DEEP_CORPUS_MAX))
+    local = search_local_index(query, max_records)
+    if local is not None:
+        if on_progress is not None:
+            on_progress(local)
+        return local, True
+
+    cache = get_literature_cache()
+    key = f"deep:{literature_cache_key(query, max_records)}"
+    hit = cache.get(key)
+    if hit is not None and hit[1] <= cache.ttl:
+        return articles_from_rows(hit[0]), True
+
+    articles, complete = [], True
+    for articles, complete in stream_deep_corpus(query, max_records):
+        if on_progress is not None:
+            on_progress(articles)
+    # Corpus parcial (alguma fonte falhou) não é persistido nem alimenta as baselines
+    if articles and complete:
+        cache.set(key, articles_to_rows(articles))
+        record_field_baselines(articles)
+    elif hit is not None:
+        # APIs indisponíveis: melhor o corpus antigo completo do que um parcial ou nenhum
+        return articles_from_rows(hit[0]), True
+    return articles, complete
+
+
+def get_deep_corpus(query: str, max_records: int = DEEP_CORPUS_DEFAULT, on_progress=None):
+    return deep_literature_corpus(query, max_records, on_progress)[0]
+
+
+def get_corpus(query: str, deep_limit: int = 0, on_progress=None):
+    # Corpus de uma análise: (artigos, completo) no modo normal (60 artigos) ou profundo (deep_limit)
+    if deep_limit:
+        return deep_literature_corpus(query, deep_limit, on_progress)
+    return literature_corpus(query, limit=60)
 
 
 def extract_top_keywords(articles, limit: int = 20):
-    text = " ".join(item.get("phrase", "") for item in (articles or [])[:30])
-    words = re.findall(r"\b\w+\b", text.lower())
-    words = [w for w in words if w not in STOP_WORDS and len(w) > 3 and not w.isdigit()]
-    return [word for word, _ in Counter(words).most_common(limit)]
+    counts = Counter()
+    for item in (articles or [])[:30]:
+        counts.update(article_token_counts(item))
+    return [word for word, _ in counts.most_common(limit)]
+
+
+# =========================
+# BASELINES POR ÁREA E ANO (média de citações aprendida do índice local: python -m citatia baselines)
+# =========================
+FIELD_BASELINES_PATH = os.environ.get("CITATIA_FIELD_BASELINES", os.path.join(CACHE_DIR, "baselines.sqlite3"))
+# Corpora das APIs vêm ordenados pelos mais citados: alimentar a tabela com eles infla a média da
+# área (um tema com 60 artigos muito citados move a célula inteira) e faz a mesma análise mudar de
+# nota entre duas consultas. Só liga o aprendizado por consulta quem aceitar esse viés.
+FIELD_BASELINE_LEARN = os.environ.get("CITATIA_FIELD_BASELINE_LEARN", "") == "1"
+# Peso, em documentos, da média de referência: células com poucos artigos ficam perto da média da
+# área, e áreas com poucos artigos perto de FIELD_BASELINES (tabela vazia = FIELD_BASELINES exato)
+FIELD_BASELINE_PRIOR_DOCS = max(float(os.environ.get("CITATIA_FIELD_BASELINE_PRIOR_DOCS", "20")), 1.0)
+FIELD_BASELINE_RELOAD = 300  # s; outros processos/réplicas também gravam na tabela
+
+
+class FieldBaselines:
+    # Retrato em memória da tabela: (área, ano) -> (docs, citações); ano 0 = desconhecido
+    def __init__(self, cells=None, prior_docs: float = FIELD_BASELINE_PRIOR_DOCS):
+        self.cells = dict(cells or {})
+        self.prior_docs = prior_docs
+        self.fields = defaultdict(lambda: [0, 0])
+        for (area, _), (docs, citations) in self.cells.items():
+            self.fields[area][0] += docs
+            self.fields[area][1] += citations
+
+    def mean(self, area: str, year: int = 0) -> float:
+        k = self.prior_docs
+        prior = FIELD_BASELINES.get(area, FIELD_BASELINES["Multidisciplinary"])
+        docs, citations = self.fields.get(area, (0, 0))
+        field_mean = (citations + prior * k) / (docs + k)
+        if not year:
+            return field_mean
+        docs, citations = self.cells.get((area, year), (0, 0))
+        return (citations + field_mean * k) / (docs + k)
+
+
+class FieldBaselineTable:
+    # Agregados (área, ano) -> (docs, soma de citações) + última contagem de citações por artigo, para
+    # que o mesmo artigo visto em várias consultas conte uma vez e só a variação das citações seja somada.
+    # Alimentada por rebuild() a partir do índice local; update() por consulta só com FIELD_BASELINE_LEARN.
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS field_year (area TEXT NOT NULL, year INTEGER NOT NULL, "
+            "docs INTEGER NOT NULL, citations INTEGER NOT NULL, PRIMARY KEY (area, year)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY, citations INTEGER NOT NULL) WITHOUT ROWID")
+        self._snapshot = None
+        self._loaded_at = 0.0
+
+    def update(self, articles) -> int:
+        # Retorna quantos artigos mudaram a tabela (novos ou com contagem de citações diferente)
+        batch = {dump_item_key(art): art for art in articles}
+        keys = list(batch)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                previous = {}
+                for start in range(0, len(keys), DF_LOOKUP_CHUNK):
+                    chunk = keys[start:start + DF_LOOKUP_CHUNK]
+                    placeholders = ",".join("?" * len(chunk))
+                    previous.update(self._conn.execute(f"SELECT key, citations FROM seen WHERE key IN ({placeholders})", chunk))
+                deltas = defaultdict(lambda: [0, 0])
+                changed = []
+                for key, art in batch.items():
+                    old = previous.get(key)
+                    if old == art.citation_count:
+                        continue
+                    year = art.year if isinstance(art.year, int) and 0 < art.year < 10_000 else 0
+                    for area in art.areas or ("Multidisciplinary",):
+                        cell = deltas[(area, year)]
+                        cell[0] += old is None
+                        cell[1] += art.citation_count - (old or 0)
+                    changed.append((key, art.citation_count))
+                self._conn.executemany(
+                    "INSERT INTO seen (key, citations) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET citations = excluded.citations",
+                    changed,
+                )
+                self._conn.executemany(
+                    "INSERT INTO field_year (area, year, docs, citations) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(area, year) DO UPDATE SET docs = docs + excluded.docs, "
+                    "citations = citations + excluded.citations",
+                    [(area, year, docs, citations) for (area, year), (docs, citations) in deltas.items()],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._snapshot = None
+        return len(changed)
+
+    def rebuild(self, articles, batch_size: int = LOCAL_INDEX_BATCH) -> int:
+        # Recomeça do zero a partir de uma coleção completa (índice local, corpora em cache)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM field_year")
+            self._conn.execute("DELETE FROM seen")
+            self._conn.execute("COMMIT")
+            self._snapshot = None
+        total = 0
+        articles = iter(articles)
+        while batch := list(itertools.islice(articles, batch_size)):
+            total += self.update(batch)
+        return total
+
+    def snapshot(self) -> FieldBaselines:
+        now = time.monotonic()
+        with self._lock:
+            if self._snapshot is None or now - self._loaded_at > FIELD_BASELINE_RELOAD:
+                rows = self._conn.execute("SELECT area, year, docs, citations FROM field_year")
+                self._snapshot = FieldBaselines({(area, year): (docs, citations) for area, year, docs, citations in rows})
+                self._loaded_at = now
+            return self._snapshot
+
+
+@process_resource
+def get_field_baseline_table() -> FieldBaselineTable:
+    return FieldBaselineTable(FIELD_BASELINES_PATH)
+
+
+def get_field_baselines() -> FieldBaselines:
+    try:
+        return get_field_baseline_table().snapshot()
+    except sqlite3.Error as exc:
+        logger.warning("Falha ao ler baselines (%s): %s", FIELD_BASELINES_PATH, exc)
+        return FieldBaselines()
 
 
-def get_publication_statistics(articles):
-    years = [item.get("year") for item in (articles or []) if isinstance(item.get("year"), int)]
-    yearly = dict(sorted(Counter(years).items()))
-    total = len(articles or [])
+def record_field_baselines(articles) -> None:
+    # Corpus novo das APIs atualiza a tabela só com FIELD_BASELINE_LEARN; falha aqui não derruba a consulta
+    if not FIELD_BASELINE_LEARN:
+        return
+    try:
+        with get_metrics().span("baseline_update"):
+            changed = get_field_baseline_table().update(articles)
+    except sqlite3.Error as exc:
+        logger.warning("Falha ao atualizar baselines (%s): %s", FIELD_BASELINES_PATH, exc)
+        return
+    get_metrics().incr("baseline_articles", changed)
+
+
+# =========================
+# MÉTRICAS (corpus colunar)
+# =========================
+class CitationCorpus:
+    # Colunas NumPy (citações, ano, fonte, área) + pares artigo→área para artigos multi-área.
+    # Uma única ordenação por citações alimenta h/g-index, mediana, top-10 e ranking de artigos.
+    def __init__(self, citations, years, source_ids, first_area_ids, pair_articles, pair_areas,
+                 source_names, area_names, articles=None, baselines=None):
+        self.citations = np.asarray(citations, dtype=np.int64)
+        self.years = np.asarray(years, dtype=np.int32)  # 0 = ano desconhecido
+        self.source_ids = np.asarray(source_ids, dtype=np.int32)
+        self.first_area_ids = np.asarray(first_area_ids, dtype=np.int32)
+        self.pair_articles = np.asarray(pair_articles, dtype=np.int64)
+        self.pair_areas = np.asarray(pair_areas, dtype=np.int32)
+        self.source_names = list(source_names)
+        self.area_names = list(area_names)
+        self.articles = articles
+        self.order = np.argsort(-self.citations, kind="stable")
+        self.sorted_desc = self.citations[self.order]
+        self.pair_baselines = self._pair_baselines(baselines if baselines is not None else get_field_baselines())
+        # Pares agrupados por artigo, na ordem das áreas: o primeiro de cada grupo é a área principal
+        first_pairs = np.flatnonzero(np.diff(self.pair_articles, prepend=-1))
+        self.article_baselines = self.pair_baselines[first_pairs]
+
+    def _pair_baselines(self, baselines: "FieldBaselines"):
+        # Baseline de cada par artigo→área pelo ano do artigo, consultada uma vez por (área, ano) distinto
+        pair_years = self.years[self.pair_articles].astype(np.int64)
+        pair_years[(pair_years < 0) | (pair_years >= 10_000)] = 0  # ano inválido = desconhecido
+        cells, inverse = np.unique(self.pair_areas.astype(np.int64) * 10_000 + pair_years, return_inverse=True)
+        values = np.array(
+            [baselines.mean(self.area_names[cell // 10_000], int(cell % 10_000)) for cell in cells], dtype=np.float64
+        )
+        return values[inverse.reshape(-1)] if cells.size else np.zeros(0, dtype=np.float64)
+
+    @classmethod
+    def from_articles(cls, articles, baselines=None):
+        articles = list(articles or [])
+        source_index, area_index = {}, {}
+        citations, years, source_ids, first_area_ids = [], [], [], []
+        pair_articles, pair_areas = [], []
+        for idx, a in enumerate(articles):
+            citations.append(a.citation_count)
+            years.append(a.year if isinstance(a.year, int) else 0)
+            source_ids.append(source_index.setdefault(a.source, len(source_index)))
+            for pos, area in enumerate(a.areas or ("Multidisciplinary",)):
+                area_id = area_index.setdefault(area, len(area_index))
+                if pos == 0:
+                    first_area_ids.append(area_id)
+                pair_articles.append(idx)
+                pair_areas.append(area_id)
+        return cls(citations, years, source_ids, first_area_ids, pair_articles, pair_areas,
+                   source_index, area_index, articles, baselines)
+
+    def __len__(self):
+        return len(self.citations)
+
+    def top_indices(self, n: int):
+        return self.order[:n]
+
+    def top_articles(self, n: int = 15):
+        return [self.articles[i] for i in self.top_indices(n)] if self.articles is not None else []
+
+    def total_citations(self) -> int:
+        return int(self.citations.sum())
+
+    def mean_citations(self) -> float:
+        return round(self.total_citations() / len(self), 2) if len(self) else 0
+
+    def median_citations(self) -> int:
+        # Mesmo critério da versão anterior: elemento n//2 da ordem crescente
+        return int(self.sorted_desc[len(self) - 1 - len(self) // 2]) if len(self) else 0
+
+    def h_index(self) -> int:
+        ranks = np.arange(1, len(self) + 1)
+        return int(np.count_nonzero(self.sorted_desc >= ranks))
+
+    def g_index(self) -> int:
+        ranks = np.arange(1, len(self) + 1)
+        hits = np.flatnonzero(np.cumsum(self.sorted_desc) >= ranks * ranks)
+        return int(hits[-1] + 1) if hits.size else 0
+
+    def concentration_top10(self) -> float:
+        total = self.total_citations()
+        return round(int(self.sorted_desc[:10].sum()) / total * 100, 2) if total else 0
+
+    def fwci_proxy(self) -> float:
+        if not len(self):
+            return 0
+        return round(float(np.mean(self.citations / self.article_baselines)), 2)
+
+    def area_metrics(self, top_n: int = 8):
+        n_areas = len(self.area_names)
+        pair_cites = self.citations[self.pair_articles]
+        area_cites = np.bincount(self.pair_areas, weights=pair_cites, minlength=n_areas)
+        area_norm = np.bincount(self.pair_areas, weights=pair_cites / self.pair_baselines, minlength=n_areas)
+        area_docs = np.bincount(self.pair_areas, minlength=n_areas)
+        ranked = np.argsort(-area_cites, kind="stable")[:top_n]
+        top_areas = [(self.area_names[i], int(area_cites[i])) for i in ranked]
+        area_fwci = {self.area_names[i]: round(float(area_norm[i] / area_docs[i]), 2) for i in range(n_areas) if area_docs[i]}
+        return top_areas, area_fwci
+
+    def source_metrics(self, top_n: int = 15):
+        n_sources = len(self.source_names)
+        if not n_sources:
+            return []
+        docs = np.bincount(self.source_ids, minlength=n_sources)
+        cites = np.bincount(self.source_ids, weights=self.citations, minlength=n_sources).astype(np.int64)
+        avg = np.round(cites / np.maximum(docs, 1), 2)
+        # Ordena por (citações, média) decrescente; empate mantém a ordem de aparição
+        ranked = np.lexsort((np.arange(n_sources), -avg, -cites))
+        quartile_size = max(math.ceil(n_sources / 4), 1)
+        rows = []
+        for pos, i in enumerate(ranked[:top_n]):
+            rows.append(
+                {
+                    "source": self.source_names[i],
+                    "docs": int(docs[i]),
+                    "citations": int(cites[i]),
+                    "avg_citations": float(avg[i]),
+                    "quartile": f"Q{min(pos // quartile_size + 1, 4)}",
+                }
+            )
+        return rows
+
+    def yearly_counts(self):
+        known = self.years[self.years != 0]
+        values, counts = np.unique(known, return_counts=True)
+        return {int(y): int(c) for y, c in zip(values, counts)}
+
+
+def get_publication_statistics(articles, corpus: CitationCorpus = None):
+    corpus = corpus if corpus is not None else CitationCorpus.from_articles(articles)
+    yearly = corpus.yearly_counts()
+    total = len(corpus)
     current_year = datetime.now().year
-    recent = sum(1 for y in years if y >= current_year - 3)
+    known = corpus.years[corpus.years != 0]
+    recent = int(np.count_nonzero(known >= current_year - 3))
     recency_ratio = (recent / total * 100) if total else 0
 
     trend_momentum = 0.0
     if yearly:
-        older = sum(v for y, v in yearly.items() if y <= current_year - 4)
-        newer = sum(v for y, v in yearly.items() if y >= current_year - 3)
+        older = int(np.count_nonzero(known <= current_year - 4))
+        newer = recent
         denom = max(older, 1)
         trend_momentum = ((newer - older) / denom) * 100
 
     return yearly, recency_ratio, round(trend_momentum, 2)
 
 
-def _compute_h_index(citations):
-    ordered = sorted(citations, reverse=True)
-    h = 0
-    for idx, c in enumerate(ordered, start=1):
-        if c >= idx:
-            h = idx
-    return h
-
-
-def _compute_g_index(citations):
-    ordered = sorted(citations, reverse=True)
-    total = 0
-    g = 0
-    for idx, c in enumerate(ordered, start=1):
-        total += c
-        if total >= idx * idx:
-            g = idx
-    return g
-
-
-def _compute_source_metrics(articles):
-    grouped = defaultdict(list)
-    for a in (articles or []):
-        grouped[a.get("source", "N/A")].append(a)
-
-    source_rows = []
-    for source, items in grouped.items():
-        cites = [i.get("citationCount", 0) for i in items]
-        source_rows.append(
-            {
-                "source": source,
-                "docs": len(items),
-                "citations": sum(cites),
-                "avg_citations": round(sum(cites) / max(len(cites), 1), 2),
-            }
-        )
-
-    ranked = sorted(source_rows, key=lambda x: (x["citations"], x["avg_citations"]), reverse=True)
-    quartile_size = max(math.ceil(len(ranked) / 4), 1)
-    for idx, row in enumerate(ranked):
-        q = min((idx // quartile_size) + 1, 4)
-        row["quartile"] = f"Q{q}"
-    return ranked[:15]
-
-
-def analyze_citation_landscape(articles, article_keywords):
-    citations = [a.get("citationCount", 0) for a in (articles or [])]
-    top_articles = sorted((articles or []), key=lambda x: x.get("citationCount", 0), reverse=True)[:15]
-
-    area_counter = Counter()
-    area_fwci = defaultdict(list)
-    for item in (articles or []):
-        c = item.get("citationCount", 0)
-        for area in (item.get("areas") or ["Multidisciplinary"]):
-            area_counter[area] += c
-            baseline = FIELD_BASELINES.get(area, FIELD_BASELINES["Multidisciplinary"])
-            area_fwci[area].append(c / baseline)
-
-    hot_keywords = set(extract_top_keywords(top_articles, limit=25))
-    overlap = len(set(article_keywords or []).intersection(hot_keywords))
-    overlap_ratio = overlap / len(article_keywords) if article_keywords else 0
-
-    total = sum(citations)
-    top10 = sum(sorted(citations, reverse=True)[:10])
-    concentration_ratio = (top10 / total * 100) if total else 0
+def corpus_landscape(corpus: CitationCorpus) -> dict:
+    # Indicadores que só dependem do corpus (iguais para todo manuscrito comparado com ele)
+    top_articles = corpus.top_articles(15)
+    top_areas, area_fwci = corpus.area_metrics(8)
+    return {
+        "top_articles": top_articles,
+        "hot_keywords": extract_top_keywords(top_articles, limit=25),
+        "total_citations": corpus.total_citations(),
+        "mean_citations": corpus.mean_citations(),
+        "median_citations": corpus.median_citations(),
+        "h_index": corpus.h_index(),
+        "g_index": corpus.g_index(),
+        "top_areas": top_areas,
+        "area_fwci": area_fwci,
+        "citation_concentration_top10": corpus.concentration_top10(),
+        "fwci_proxy": corpus.fwci_proxy(),
+        "source_metrics": corpus.source_metrics(15),
+    }
 
-    fwci_values = []
-    for item in (articles or []):
-        first_area = (item.get("areas") or ["Multidisciplinary"])[0]
-        fwci_values.append(item.get("citationCount", 0) / FIELD_BASELINES.get(first_area, 18))
 
-    median = 0
-    if citations:
-        ordered = sorted(citations)
-        median = ordered[len(ordered) // 2]
+def manuscript_landscape(landscape: dict, corpus: CitationCorpus, article_keywords, query_text: str = None,
+                         tfidf: "TfidfMatrix" = None) -> dict:
+    # Parte de cada manuscrito: sobreposição com as palavras quentes e similaridade TF-IDF
+    overlap = len(set(article_keywords or []).intersection(landscape["hot_keywords"]))
+    overlap_ratio = overlap / len(article_keywords) if article_keywords else 0
 
+    # Sem o texto do manuscrito, as palavras do tema servem de consulta
+    tfidf = tfidf if tfidf is not None else TfidfMatrix(corpus.articles or [], get_df_table())
+    similarities, semantic_fit = tfidf.similarity(query_text or " ".join(article_keywords or []))
+    closest = np.argsort(-similarities, kind="stable")[:10]
     return {
-        "top_articles": top_articles,
-        "total_citations": total,
-        "mean_citations": round((total / len(citations)) if citations else 0, 2),
-        "median_citations": median,
-        "h_index": _compute_h_index(citations),
-        "g_index": _compute_g_index(citations),
-        "top_areas": area_counter.most_common(8),
-        "area_fwci": {k: round(sum(v) / len(v), 2) for k, v in area_fwci.items()},
         "keyword_overlap_ratio": overlap_ratio,
-        "citation_concentration_top10": round(concentration_ratio, 2),
-        "fwci_proxy": round(sum(fwci_values) / len(fwci_values), 2) if fwci_values else 0,
-        "source_metrics": _compute_source_metrics(articles),
+        "similarities": similarities,
+        "semantic_fit": round(semantic_fit, 4),
+        "closest_articles": [(corpus.articles[i], round(float(similarities[i]), 4)) for i in closest],
     }
 
 
-def evaluate_article_relevance(total_articles, overlap_ratio, recency_ratio, fwci_proxy, trend_momentum):
+def analyze_citation_landscape(articles, article_keywords, corpus: CitationCorpus = None, query_text: str = None):
+    corpus = corpus if corpus is not None else CitationCorpus.from_articles(articles)
+    landscape = corpus_landscape(corpus)
+    return {**landscape, **manuscript_landscape(landscape, corpus, article_keywords, query_text)}
+
+
+# =========================
+# SIMILARIDADE SEMÂNTICA (TF-IDF esparso + tabela de frequência documental em disco)
+# =========================
+DF_TABLE_PATH = os.environ.get("CITATIA_DF_TABLE", os.path.join(CACHE_DIR, "df.sqlite3"))
+SIMILARITY_RELATED_MIN = 0.1  # cosseno a partir do qual o artigo conta como concorrente direto
+SEMANTIC_FIT_FULL = 0.5  # cosseno com o centróide do corpus que já vale o peso total de alinhamento
+DF_LOOKUP_CHUNK = 900  # limite de parâmetros por consulta SQLite
+
+
+class DocumentFrequencyTable:
+    # Em quantos documentos de uma coleção de referência cada termo aparece; só os termos da
+    # análise corrente são lidos do disco
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS df (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    @property
+    def n_docs(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'n_docs'").fetchone()
+        return row[0] if row else 0
+
+    def lookup(self, terms):
+        # -> array de df alinhado com terms (0 para termos nunca vistos)
+        found = {}
+        with self._lock:
+            for start in range(0, len(terms), DF_LOOKUP_CHUNK):
+                chunk = terms[start:start + DF_LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(self._conn.execute(f"SELECT term, df FROM df WHERE term IN ({placeholders})", chunk))
+        return np.fromiter((found.get(t, 0) for t in terms), dtype=np.float64, count=len(terms))
+
+    def rebuild(self, documents, batch_size: int = LOCAL_INDEX_BATCH) -> int:
+        # documents: iterável de textos; conta em memória e regrava a tabela numa transação
+        counts = Counter()
+        n_docs = 0
+        for text in documents:
+            counts.update(set(tokenize_keywords(text)))
+            n_docs += 1
+        items = list(counts.items())
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM df")
+            for start in range(0, len(items), batch_size):
+                self._conn.executemany("INSERT INTO df (term, df) VALUES (?, ?)", items[start:start + batch_size])
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('n_docs', ?)", (n_docs,))
+            self._conn.execute("COMMIT")
+        return n_docs
+
+
+@process_resource
+def get_df_table():
+    # None sem tabela construída (python -m citatia idf): o próprio corpus serve de referência
+    if not os.path.exists(DF_TABLE_PATH):
+        return None
+    return DocumentFrequencyTable(DF_TABLE_PATH)
+
+
+class TfidfMatrix:
+    # Lado do corpus do TF-IDF: matriz CSR (artigos x termos) normalizada e centróide, montados uma
+    # vez; cada consulta custa só um produto matriz-vetor (modo comparação: vários manuscritos por corpus)
+    def __init__(self, articles, df_table: DocumentFrequencyTable = None):
+        n = len(articles)
+        # Contagens já filtradas e guardadas no artigo (article_token_counts): nada é re-tokenizado aqui
+        counts = [article_token_counts(art) for art in articles]
+        self.n = n
+        self.df_table = df_table if df_table is not None and df_table.n_docs else None
+
+        terms = sorted(set().union(*counts))
+        self.vocab = {t: i for i, t in enumerate(terms)}
+        total = sum(map(len, counts))
+        term_ids = np.fromiter((self.vocab[t] for c in counts for t in c), dtype=np.int64, count=total)
+        tf = np.fromiter((k for c in counts for k in c.values()), dtype=np.float64, count=total)
+        doc_ids = np.repeat(np.arange(n, dtype=np.int64), [len(c) for c in counts])
+        order = np.lexsort((term_ids, doc_ids))  # ordenado por artigo: layout CSR
+        self.rows, self.indices, tf = doc_ids[order], term_ids[order], tf[order]
+
+        if self.df_table is not None:
+            self.n_docs, df = self.df_table.n_docs, self.df_table.lookup(terms)
+        else:
+            self.n_docs, df = n, np.bincount(self.indices, minlength=len(terms)).astype(np.float64)
+        self.idf = self._idf(df)
+
+        data = (1 + np.log(tf)) * self.idf[self.indices]
+        norms = np.sqrt(np.bincount(self.rows, weights=data * data, minlength=n))
+        data /= norms[self.rows]
+        self.data = data
+        centroid = np.bincount(self.indices, weights=data, minlength=len(terms))
+        centroid_norm = np.linalg.norm(centroid)
+        self.centroid = centroid / centroid_norm if centroid_norm else centroid
+
+    def _idf(self, df):
+        return np.log((1 + self.n_docs) / (1 + df)) + 1  # IDF suavizado: termo ausente da referência pesa o máximo
+
+    def similarity(self, query_text: str):
+        # -> (similaridade de cosseno por artigo, aderência ao centróide do corpus)
+        query_terms = Counter(tokenize_keywords(query_text))
+        if self.n == 0 or not query_terms:
+            return np.zeros(self.n), 0.0
+
+        # Termos só da consulta não pontuam contra o corpus, mas entram na norma da consulta
+        outside = [t for t in query_terms if t not in self.vocab]
+        if self.df_table is not None and outside:
+            outside_idf = self._idf(self.df_table.lookup(outside))
+        else:
+            outside_idf = self._idf(np.zeros(len(outside)))
+        inside = [t for t in query_terms if t in self.vocab]
+        inside_idx = np.fromiter((self.vocab[t] for t in inside), dtype=np.int64, count=len(inside))
+        inside_w = (1 + np.log(np.fromiter((query_terms[t] for t in inside), dtype=np.float64))) * self.idf[inside_idx]
+        outside_w = (1 + np.log(np.fromiter((query_terms[t] for t in outside), dtype=np.float64))) * outside_idf
+        norm = np.sqrt(inside_w @ inside_w + outside_w @ outside_w)
+
+        query = np.zeros(len(self.vocab))
+        query[inside_idx] = inside_w / norm
+        similarities = np.bincount(self.rows, weights=self.data * query[self.indices], minlength=self.n)
+        fit = float(query @ self.centroid)
+        return similarities, fit
+
+
+def tfidf_similarity(query_text: str, articles, df_table: DocumentFrequencyTable = None):
+    # Retorna (similaridade por artigo, aderência ao centróide do corpus)
+    return TfidfMatrix(articles, df_table).similarity(query_text)
+
+
+def evaluate_article_relevance(
+    total_articles, overlap_ratio, recency_ratio, fwci_proxy, trend_momentum, similarities=None, semantic_fit=None
+):
+    # Com similaridades, a saturação conta só os artigos realmente próximos do manuscrito
+    # e o alinhamento vem do TF-IDF em vez da interseção de palavras
+    if similarities is not None:
+        total_articles = int(np.count_nonzero(np.asarray(similarities) >= SIMILARITY_RELATED_MIN))
+    alignment = overlap_ratio if semantic_fit is None else min(semantic_fit / SEMANTIC_FIT_FULL, 1)
     saturation_penalty = min(total_articles / 80, 1) * 25
 
     score = 45
-    score += overlap_ratio * 25
+    score += alignment * 25
     score += (recency_ratio / 100) * 15
     score += min(fwci_proxy / 2, 1) * 10
     score += min(max(trend_momentum, -100), 200) / 200 * 10
@@ -356,6 +2369,16 @@ def evaluate_article_relevance(total_articles, overlap_ratio, recency_ratio, fwc
 # =========================
 # PDF REPORT
 # =========================
+@process_resource
+def get_report_styles():
+    # getSampleStyleSheet() recria ~20 estilos a cada chamada; montados uma vez por processo
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+
+    styles = getSampleStyleSheet()
+    body = ParagraphStyle("Body", parent=styles["BodyText"], alignment=4, spaceAfter=8)
+    return styles, body
+
+
 def generate_report(
     tema,
     top_keywords,
@@ -365,11 +2388,15 @@ def generate_report(
     landscape,
     score,
     descricao,
-    output_path="report.pdf",
+    output_path=None,
 ):
-    doc = SimpleDocTemplate(output_path, pagesize=A4)
-    styles = getSampleStyleSheet()
-    body = ParagraphStyle("Body", parent=styles["BodyText"], alignment=4, spaceAfter=8)
+    # Sem output_path o PDF é montado em memória e os bytes são retornados (nada é gravado no CWD)
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import Paragraph, SimpleDocTemplate
+
+    buffer = BytesIO() if output_path is None else None
+    doc = SimpleDocTemplate(buffer if buffer is not None else output_path, pagesize=A4)
+    styles, body = get_report_styles()
 
     content = [
         Paragraph("<b>Relatório Bibliométrico Avançado (Scopus/WoS-like) - CitatIA</b>", styles["Title"]),
@@ -419,33 +2446,120 @@ def generate_report(
     for item in landscape["top_articles"][:10]:
         content.append(
             Paragraph(
-                f"• {item.get('title', 'Sem título')}<br/>"
-                f"<b>DOI:</b> {item.get('doi', 'N/A')}<br/>"
-                f"<b>Fonte:</b> {item.get('source', 'N/A')}<br/>"
-                f"<b>Citações:</b> {item.get('citationCount', 0)}",
+                f"• {item.title or 'Sem título'}<br/>"
+                f"<b>DOI:</b> {item.doi}<br/>"
+                f"<b>Fonte:</b> {item.source}<br/>"
+                f"<b>Citações:</b> {item.citation_count}",
+                body,
+            )
+        )
+
+    doc.build(content)
+    return buffer.getvalue() if buffer is not None else None
+
+
+def generate_comparison_report(comparison: dict, output_path=None):
+    # Relatório combinado: tabela lado a lado, um bloco por grupo (corpus) e um por manuscrito
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape as landscape_page
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Table, TableStyle
+
+    buffer = BytesIO() if output_path is None else None
+    doc = SimpleDocTemplate(buffer if buffer is not None else output_path, pagesize=landscape_page(A4))
+    styles, body = get_report_styles()
+    cell = ParagraphStyle("Cell", parent=styles["BodyText"], fontSize=7, leading=8)
+
+    columns = [c for c in COMPARISON_COLUMNS if c != "Tema"]
+    rows = comparison_table(comparison)
+    table = Table(
+        [[Paragraph(f"<b>{c}</b>", cell) for c in columns]]
+        + [[Paragraph("-" if row[c] is None else str(row[c]), cell) for c in columns] for row in rows],
+        repeatRows=1,
+    )
+    table.setStyle(
+        TableStyle(
+            [
+                ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+                ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+                ("VALIGN", (0, 0), (-1, -1), "TOP"),
+            ]
+        )
+    )
+    content = [
+        Paragraph("<b>Relatório Comparativo de Manuscritos - CitatIA</b>", styles["Title"]),
+        Paragraph(
+            f"<b>Manuscritos:</b> {len(rows)} | <b>Grupos temáticos (corpora consultados):</b> {len(comparison['groups'])}",
+            body,
+        ),
+        table,
+    ]
+
+    for g, group in enumerate(comparison["groups"], start=1):
+        content.append(Paragraph(f"<b>Grupo {g}:</b> {group['query']}", styles["Heading2"]))
+        content.append(Paragraph(f"<b>Manuscritos:</b> {', '.join(group['members'])}", body))
+        landscape = group.get("landscape")
+        if landscape is None:
+            content.append(Paragraph(ERROR_NO_ARTICLES, body))
+            continue
+        content.append(
+            Paragraph(
+                f"<b>Artigos no corpus:</b> {group['total_articles']} | <b>Média de citações:</b> {landscape['mean_citations']} | "
+                f"<b>FWCI Proxy:</b> {landscape['fwci_proxy']} | <b>h-index:</b> {landscape['h_index']} | "
+                f"<b>g-index:</b> {landscape['g_index']} | <b>Recência (3 anos):</b> {group['recency_ratio']:.2f}% | "
+                f"<b>Momentum:</b> {group['trend_momentum']:.2f}%",
                 body,
             )
         )
+        areas = "; ".join(f"{area} ({cites})" for area, cites in landscape["top_areas"][:5])
+        content.append(Paragraph(f"<b>Áreas mais citadas:</b> {areas}", body))
+        content.append(Paragraph(f"<b>Palavras dominantes:</b> {', '.join(group['top_keywords'][:10])}", body))
+        content.append(Paragraph("<b>Artigos mais citados:</b>", styles["Heading3"]))
+        for item in landscape["top_articles"][:5]:
+            content.append(Paragraph(f"• {item.title or 'Sem título'} | {item.source} | Citações: {item.citation_count}", body))
+
+    content.append(Paragraph("<b>Manuscritos</b>", styles["Heading2"]))
+    for m in comparison["manuscripts"]:
+        content.append(Paragraph(f"<b>{m['name']}</b>", styles["Heading3"]))
+        result = m.get("result")
+        if result is None:
+            content.append(Paragraph(m["error"], body))
+            continue
+        content.append(Paragraph(f"<b>Tema:</b> {result['tema']}", body))
+        content.append(Paragraph(f"<b>Score de potencial:</b> {result['score']}% | {result['descricao']}", body))
+        for item, similarity in result["landscape"]["closest_articles"][:3]:
+            content.append(Paragraph(f"• Mais próximo: {item.title or 'Sem título'} | Similaridade: {similarity}", body))
 
     doc.build(content)
+    return buffer.getvalue() if buffer is not None else None
 
 
 # =========================
 # PIX / QR
 # =========================
-def gerar_qr_code_pix(payload: str):
+PIX_PAYLOAD = "00020126400014br.gov.bcb.pix0118peas8810@gmail.com520400005303986540520.005802BR5925PEDRO EMILIO AMADOR SALOM6013TEOFILO OTONI62200516PEASTECHNOLOGIES6304C9DB"
+
+
+def gerar_qr_code_pix(payload: str) -> bytes:
+    # PNG direto via PyPNG: sem PIL e sem o ciclo salvar/reabrir imagem
+    import qrcode
+    from qrcode.image.pure import PyPNGImage
+
     qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=10, border=4)
     qr.add_data(payload)
     qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
     buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
-    return Image.open(buffer)
+    qr.make_image(image_factory=PyPNGImage).save(buffer)
+    return buffer.getvalue()
+
+
+@process_resource
+def get_pix_qr_code() -> bytes:
+    # Payload fixo: o QR é gerado uma vez por processo, não a cada rerun
+    return gerar_qr_code_pix(PIX_PAYLOAD)
 
 
 def render_donation_section():
-    payload = "00020126400014br.gov.bcb.pix0118peas8810@gmail.com520400005303986540520.005802BR5925PEDRO EMILIO AMADOR SALOM6013TEOFILO OTONI62200516PEASTECHNOLOGIES6304C9DB"
     st.markdown("---")
     st.markdown(
         """
@@ -456,109 +2570,853 @@ def render_donation_section():
         """,
         unsafe_allow_html=True,
     )
-    st.image(gerar_qr_code_pix(payload), caption="QR Code Pix (R$ 20,00)", width=300)
+    st.image(get_pix_qr_code(), caption="QR Code Pix (R$ 20,00)", width=300)
 
 
 # =========================
-# APP
+# ANÁLISE (pipeline memoizado por PDF)
 # =========================
-def main():
-    st.title("CitatIA - Benchmark Bibliométrico (CiteScore/JCR-like)")
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.environ.get("CITATIA_ANALYSIS_CACHE_MAX_ENTRIES", "128"))
+REPORT_CACHE_MAX_ENTRIES = int(os.environ.get("CITATIA_REPORT_CACHE_MAX_ENTRIES", "64"))
+ERROR_NO_TEXT = "Não foi possível extrair texto suficiente do PDF. Se for escaneado, será necessário OCR."
+ERROR_NO_ARTICLES = "Não foi possível recuperar artigos nas bases externas para este tema."
+ERROR_PDF_TOO_LARGE = f"O PDF excede o limite de {PDF_MAX_UPLOAD_MB} MB."
+WARNING_PARTIAL_CORPUS = "⚠️ Uma das bases externas não respondeu: resultado calculado sobre um corpus parcial."
 
-    # Registro
-    with st.expander("📋 Registro de Usuário", expanded=False):
-        nome = st.text_input("Nome completo")
-        email = st.text_input("E-mail")
-        if st.button("Salvar Dados"):
-            if nome and email:
-                codigo = gerar_codigo_verificacao(email)
-                salvar_email_google_sheets(nome, email, codigo)
-                st.success(f"Código de verificação gerado: **{codigo}**")
-            else:
-                st.warning("⚠️ Preencha todos os campos.")
 
-    # Upload do PDF
-    st.subheader("📄 Enviar PDF para análise")
-    uploaded_file = st.file_uploader("Envie o arquivo PDF", type="pdf")
+class BoundedCache:
+    # LRU em memória compartilhado por todas as sessões do processo
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.stats = Counter()
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            if key not in self._data:
+                self.stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self.stats["hits"] += 1
+            return self._data[key]
+
+    def set(self, key: str, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.stats["evictions"] += 1
+
 
-    if uploaded_file:
-        st.info("🔍 Extraindo texto do PDF...")
-        user_text = extract_text_from_pdf_bytes(uploaded_file.getvalue())
+@process_resource
+def get_analysis_cache() -> BoundedCache:
+    cache = BoundedCache(ANALYSIS_CACHE_MAX_ENTRIES)
+    get_metrics().register("analysis_cache", lambda: dict(cache.stats))
+    return cache
 
-        if not user_text or len(user_text) < 200:
-            st.error("Não foi possível extrair texto suficiente do PDF. Se for escaneado, será necessário OCR.")
-            st.stop()
 
-        tema, article_keywords = identify_theme(user_text)
+@process_resource
+def get_report_cache() -> BoundedCache:
+    cache = BoundedCache(REPORT_CACHE_MAX_ENTRIES)
+    get_metrics().register("report_cache", lambda: dict(cache.stats))
+    return cache
 
-        with st.spinner("Consultando bases (Semantic Scholar + Crossref)..."):
-            articles = get_popular_phrases(tema, limit=60)
 
+# Resultados de análise/comparação são objetos Python em pickle: muda quando o dict do resultado,
+# Article ou as funções de pontuação mudam (entradas antigas são ignoradas)
+ANALYSIS_RESULT_FORMAT = "a1"
+
+
+def analysis_cache_key(source, full_extraction: bool, deep_limit: int = 0) -> str:
+    mode = "full" if full_extraction else "sample"
+    return f"{ANALYSIS_RESULT_FORMAT}:{pdf_digest(source)}:{mode}:{deep_limit}"
+
+
+def pdf_too_large(size: int) -> bool:
+    return bool(PDF_MAX_UPLOAD_MB) and size > PDF_MAX_UPLOAD_MB * 1024 * 1024
+
+
+def extract_manuscript_theme(source, full_extraction: bool = False):
+    # source = caminho ou bytes do PDF; retorna (texto, tema, palavras do tema) ou None se não há texto suficiente
+    if full_extraction:
+        user_text = extract_text_from_pdf(source)
+    else:
+        user_text = extract_theme_sample(source)
+
+    if not user_text or len(user_text) < 200:
+        return None
+    tema, article_keywords = identify_theme(user_text)
+    return user_text, tema, article_keywords
+
+
+def analyze_corpus(articles) -> dict:
+    # Etapa cara e comum a todos os manuscritos do mesmo corpus: no modo comparação roda uma vez por grupo
+    corpus = CitationCorpus.from_articles(articles)
+    yearly, recency_ratio, trend_momentum = get_publication_statistics(articles, corpus)
+    return {
+        "articles": articles,
+        "corpus": corpus,
+        "top_keywords": extract_top_keywords(articles, limit=20),
+        "yearly": yearly,
+        "recency_ratio": recency_ratio,
+        "trend_momentum": trend_momentum,
+        "landscape": corpus_landscape(corpus),
+        "tfidf": TfidfMatrix(articles, get_df_table()),
+    }
+
+
+def score_manuscript(tema: str, article_keywords, articles, text: str = None, shared: dict = None) -> dict:
+    # shared = analyze_corpus(articles) já calculado (modo comparação); sem ele é calculado aqui
+    shared = shared if shared is not None else analyze_corpus(articles)
+    landscape = {
+        **shared["landscape"],
+        **manuscript_landscape(shared["landscape"], shared["corpus"], article_keywords, text, shared["tfidf"]),
+    }
+    score, descricao = evaluate_article_relevance(
+        total_articles=len(articles),
+        overlap_ratio=landscape["keyword_overlap_ratio"],
+        recency_ratio=shared["recency_ratio"],
+        fwci_proxy=landscape["fwci_proxy"],
+        trend_momentum=shared["trend_momentum"],
+        similarities=landscape["similarities"],
+        semantic_fit=landscape["semantic_fit"],
+    )
+
+    return {
+        "tema": tema,
+        "article_keywords": article_keywords,
+        "articles": articles,
+        "top_keywords": shared["top_keywords"],
+        "yearly": shared["yearly"],
+        "recency_ratio": shared["recency_ratio"],
+        "trend_momentum": shared["trend_momentum"],
+        "landscape": landscape,
+        "score": score,
+        "descricao": descricao,
+    }
+
+
+def run_analysis(
+    source, full_extraction: bool = False, deep_limit: int = 0, on_progress=None, on_stage=None
+) -> dict:
+    # on_stage(etapa) é chamado ao entrar em cada etapa: "extracting", "querying", "scoring"
+    on_stage = on_stage or (lambda stage: None)
+    metrics = get_metrics()
+    size = pdf_size(source)
+    if pdf_too_large(size):
+        metrics.incr("pdf_rejected_size")
+        return {"error": ERROR_PDF_TOO_LARGE}
+    metrics.incr("pdf_bytes", size)
+    on_stage(JOB_EXTRACTING)
+    with metrics.span("extract", mode="full" if full_extraction else "sample"):
+        extracted = extract_manuscript_theme(source, full_extraction)
+    if extracted is None:
+        return {"error": ERROR_NO_TEXT}
+
+    user_text, tema, article_keywords = extracted
+    on_stage(JOB_QUERYING)
+    with metrics.span("query", mode="deep" if deep_limit else "normal"):
+        articles, complete = get_corpus(tema, deep_limit, on_progress=on_progress)
+    metrics.incr("corpus_articles", len(articles))
+    if not articles:
+        return {"error": ERROR_NO_ARTICLES, "tema": tema}
+
+    on_stage(JOB_SCORING)
+    with metrics.span("score"):
+        result = score_manuscript(tema, article_keywords, articles, user_text)
+    if not complete:
+        result["partial"] = True
+    return result
+
+
+# Modo comparação: vários manuscritos, temas agrupados, um corpus (e uma análise de corpus) por grupo
+COMPARE_CLUSTER_MIN_JACCARD = float(os.environ.get("CITATIA_COMPARE_CLUSTER_JACCARD", "0.5"))
+COMPARE_MAX_FILES = int(os.environ.get("CITATIA_COMPARE_MAX_FILES", "10"))
+COMPARISON_COLUMNS = (
+    "Manuscrito",
+    "Grupo",
+    "Tema",
+    "Score (%)",
+    "Aderência TF-IDF",
+    "Sobreposição",
+    "Concorrentes diretos",
+    "FWCI proxy",
+    "h-index",
+    "Recência (%)",
+    "Momentum (%)",
+    "Situação",
+)
+
+
+def cluster_themes(keyword_lists, threshold: float = None):
+    # Ligação simples (union-find) sobre o Jaccard das palavras do tema; grupos na ordem de envio
+    threshold = COMPARE_CLUSTER_MIN_JACCARD if threshold is None else threshold
+    sets = [set(keywords) for keywords in keyword_lists]
+    parent = list(range(len(sets)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in itertools.combinations(range(len(sets)), 2):
+        union = sets[i] | sets[j]
+        if union and len(sets[i] & sets[j]) / len(union) >= threshold:
+            parent[find(j)] = find(i)
+    groups = defaultdict(list)
+    for i in range(len(sets)):
+        groups[find(i)].append(i)
+    return list(groups.values())
+
+
+def cluster_theme(keyword_lists):
+    # Tema do grupo: palavras presentes em mais manuscritos primeiro, desempate pela posição média.
+    # Grupo de um manuscrito só = o próprio tema (mesma chave de cache da análise individual)
+    votes, positions = Counter(), Counter()
+    for keywords in keyword_lists:
+        for pos, word in enumerate(keywords):
+            votes[word] += 1
+            positions[word] += pos
+    words = sorted(votes, key=lambda w: (-votes[w], positions[w] / votes[w]))[:THEME_TOP_N]
+    return (", ".join(words) if words else "Tema não identificado"), words
+
+
+def compare_manuscripts(items, full_extraction: bool = False, deep_limit: int = 0, on_stage=None) -> dict:
+    # items = [(nome, caminho ou bytes)]; on_stage(etapa, detalhe) como em run_analysis
+    on_stage = on_stage or (lambda stage, detail="": None)
+    metrics = get_metrics()
+    manuscripts = []
+    for pos, (name, source) in enumerate(items):
+        on_stage(JOB_EXTRACTING, f"{pos + 1}/{len(items)}")
+        entry = {"name": name}
+        if pdf_too_large(pdf_size(source)):
+            entry["error"] = ERROR_PDF_TOO_LARGE
+        else:
+            with metrics.span("extract", mode="full" if full_extraction else "sample"):
+                extracted = extract_manuscript_theme(source, full_extraction)
+            if extracted is None:
+                entry["error"] = ERROR_NO_TEXT
+            else:
+                entry["text"], entry["tema"], entry["article_keywords"] = extracted
+        manuscripts.append(entry)
+
+    ready = [m for m in manuscripts if "error" not in m]
+    clusters = cluster_themes([m["article_keywords"] for m in ready])
+    groups = []
+    for g, members in enumerate(clusters):
+        members = [ready[i] for i in members]
+        query, _ = cluster_theme([m["article_keywords"] for m in members])
+        group = {"query": query, "members": [m["name"] for m in members]}
+        groups.append(group)
+        for m in members:
+            m["group"] = g + 1
+
+        on_stage(JOB_QUERYING, f"grupo {g + 1}/{len(clusters)}: {query}")
+        with metrics.span("query", mode="deep" if deep_limit else "normal"):
+            articles, complete = get_corpus(query, deep_limit)
+        metrics.incr("corpus_articles", len(articles))
+        group["total_articles"] = len(articles)
+        if not complete:
+            group["partial"] = True
         if not articles:
-            st.error("Não foi possível recuperar artigos nas bases externas para este tema.")
-            st.stop()
-
-        top_keywords = extract_top_keywords(articles, limit=20)
-        yearly, recency_ratio, trend_momentum = get_publication_statistics(articles)
-        landscape = analyze_citation_landscape(articles, article_keywords)
-        score, descricao = evaluate_article_relevance(
-            total_articles=len(articles),
-            overlap_ratio=landscape["keyword_overlap_ratio"],
-            recency_ratio=recency_ratio,
-            fwci_proxy=landscape["fwci_proxy"],
-            trend_momentum=trend_momentum,
+            for m in members:
+                m["error"] = ERROR_NO_ARTICLES
+            continue
+
+        # Corpus analisado uma vez; cada manuscrito só paga sobreposição, TF-IDF da consulta e score
+        on_stage(JOB_SCORING, f"grupo {g + 1}")
+        with metrics.span("score", mode="shared"):
+            shared = analyze_corpus(articles)
+            for m in members:
+                m["result"] = score_manuscript(m["tema"], m["article_keywords"], articles, m["text"], shared)
+        for field_name in ("top_keywords", "yearly", "recency_ratio", "trend_momentum", "landscape"):
+            group[field_name] = shared[field_name]
+
+    for m in manuscripts:
+        m.pop("text", None)
+    metrics.incr("compare_manuscripts", len(manuscripts))
+    metrics.incr("compare_groups", len(groups))
+    return {"kind": "comparison", "manuscripts": manuscripts, "groups": groups}
+
+
+def comparison_table(comparison: dict):
+    # Uma linha por manuscrito, colunas em COMPARISON_COLUMNS (indicadores None para manuscritos com erro)
+    rows = []
+    for m in comparison["manuscripts"]:
+        result = m.get("result")
+        row = dict.fromkeys(COMPARISON_COLUMNS)
+        row.update({"Manuscrito": m["name"], "Grupo": m.get("group"), "Tema": m.get("tema")})
+        if result is None:
+            row["Situação"] = m["error"]
+        else:
+            landscape = result["landscape"]
+            row.update(
+                {
+                    "Score (%)": result["score"],
+                    "Aderência TF-IDF": landscape["semantic_fit"],
+                    "Sobreposição": round(landscape["keyword_overlap_ratio"], 2),
+                    "Concorrentes diretos": int(np.count_nonzero(landscape["similarities"] >= SIMILARITY_RELATED_MIN)),
+                    "FWCI proxy": landscape["fwci_proxy"],
+                    "h-index": landscape["h_index"],
+                    "Recência (%)": round(result["recency_ratio"], 2),
+                    "Momentum (%)": result["trend_momentum"],
+                    "Situação": "ok",
+                }
+            )
+        rows.append(row)
+    return rows
+
+
+def report_from_result(result: dict, output_path=None):
+    if result.get("kind") == "comparison":
+        return generate_comparison_report(result, output_path=output_path)
+    return generate_report(
+        tema=result["tema"],
+        top_keywords=result["top_keywords"],
+        yearly_counts=result["yearly"],
+        recency_ratio=result["recency_ratio"],
+        trend_momentum=result["trend_momentum"],
+        landscape=result["landscape"],
+        score=result["score"],
+        descricao=result["descricao"],
+        output_path=output_path,
+    )
+
+
+def get_report_pdf(result: dict) -> bytes:
+    # Gerado só quando pedido e reaproveitado por hash da análise
+    cache = get_report_cache()
+    report = cache.get(result["analysis_key"])
+    if report is None:
+        metrics = get_metrics()
+        with metrics.span("report"):
+            report = report_from_result(result)
+        metrics.incr("report_bytes", len(report))
+        cache.set(result["analysis_key"], report)
+    return report
+
+
+# =========================
+# FILA DE ANÁLISES (pool limitado, estados de progresso, resultados persistidos)
+# =========================
+ANALYSIS_WORKERS = int(os.environ.get("CITATIA_ANALYSIS_WORKERS", str(os.cpu_count() or 1)))
+ANALYSIS_QUEUE_MAX = int(os.environ.get("CITATIA_ANALYSIS_QUEUE_MAX", str(ANALYSIS_WORKERS * 4)))
+ANALYSIS_RESULTS_PATH = os.environ.get("CITATIA_ANALYSIS_RESULTS", os.path.join(CACHE_DIR, "analyses.sqlite3"))
+ANALYSIS_RESULT_TTL = int(os.environ.get("CITATIA_ANALYSIS_RESULT_TTL", str(60 * 60 * 24 * 7)))  # 7 dias
+ANALYSIS_RESULT_MAX_ENTRIES = int(os.environ.get("CITATIA_ANALYSIS_RESULT_MAX_ENTRIES", "1000"))
+JOB_HISTORY = 1000  # jobs concluídos mantidos em memória para consulta por ID
+JOB_POLL_INTERVAL = 1.0
+
+JOB_QUEUED = "queued"
+JOB_EXTRACTING = "extracting"
+JOB_QUERYING = "querying"
+JOB_SCORING = "scoring"
+JOB_RENDERING = "rendering"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_LABELS = {
+    JOB_QUEUED: "⏳ Na fila",
+    JOB_EXTRACTING: "📄 Extraindo texto do PDF",
+    JOB_QUERYING: "🔍 Consultando bases (Semantic Scholar + Crossref)",
+    JOB_SCORING: "📊 Calculando indicadores",
+    JOB_RENDERING: "🖨️ Montando relatório PDF",
+}
+ERROR_QUEUE_FULL = "⏳ Servidor ocupado: muitas análises na fila. Tente novamente em instantes."
+
+
+class Job:
+    def __init__(self, kind: str, key: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.state = JOB_QUEUED
+        self.detail = ""
+        self.result = None
+        self.error = None
+        self.cached = False
+        self.created_at = time.time()
+        self.finished_at = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in (JOB_DONE, JOB_FAILED)
+
+    def set_state(self, state: str, detail: str = "") -> None:
+        self.state = state
+        self.detail = detail
+
+
+class JobQueue:
+    # Admissão por fila limitada (cheia = recusa imediata), um job ativo por chave (uploads repetidos
+    # do mesmo PDF acompanham o mesmo job) e workers em número fixo
+    def __init__(self, workers: int, max_pending: int, metrics: Metrics):
+        self.workers = max(1, workers)
+        self.metrics = metrics
+        self.stats = Counter()
+        self._pending = queue.Queue(maxsize=max(1, max_pending))
+        self._jobs = OrderedDict()
+        self._active = {}
+        self._running = 0
+        self._lock = threading.Lock()
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f"citatia-job-{i}", daemon=True).start()
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _register(self, job: Job) -> None:
+        self._jobs[job.id] = job
+        while len(self._jobs) > JOB_HISTORY:
+            oldest = next(iter(self._jobs.values()))
+            if not oldest.finished:
+                break
+            self._jobs.popitem(last=False)
+
+    def completed(self, kind: str, key: str, result) -> Job:
+        # Resultado já disponível (cache): job concluído sem passar pela fila
+        job = Job(kind, key)
+        job.result, job.cached, job.state = result, True, JOB_DONE
+        job.finished_at = job.created_at
+        with self._lock:
+            self.stats["cached"] += 1
+            self._register(job)
+        return job
+
+    def submit(self, kind: str, key: str, fn, on_discard=None):
+        # fn(job) roda num worker e devolve o resultado; None = fila cheia. on_discard() é chamado
+        # quando fn não vai rodar (fila cheia ou job igual já ativo) para liberar o que foi preparado
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                self.stats["coalesced"] += 1
+            else:
+                job = Job(kind, key)
+                try:
+                    self._pending.put_nowait((job, fn))
+                except queue.Full:
+                    self.stats["rejected"] += 1
+                    job = None
+                else:
+                    self.stats["admitted"] += 1
+                    self._active[key] = job
+                    self._register(job)
+                    return job
+        if on_discard is not None:
+            on_discard()
+        return job
+
+    def _work(self) -> None:
+        while True:
+            job, fn = self._pending.get()
+            with self._lock:
+                self._running += 1
+            self.metrics.observe("job_wait", time.time() - job.created_at, kind=job.kind)
+            try:
+                with self.metrics.span("job_run", kind=job.kind):
+                    job.result = fn(job)
+                job.set_state(JOB_DONE)
+            except Exception as exc:
+                logger.exception("Job %s (%s) falhou", job.id, job.kind)
+                job.error = f"{type(exc).__name__}: {exc}"
+                job.set_state(JOB_FAILED)
+            finally:
+                job.finished_at = time.time()
+                with self._lock:
+                    self._running -= 1
+                    self._active.pop(job.key, None)
+                    self.stats["completed" if job.state == JOB_DONE else "failed"] += 1
+
+    def stats_snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "queued": self._pending.qsize(), "running": self._running, "workers": self.workers}
+
+
+@process_resource
+def get_job_queue() -> JobQueue:
+    metrics = get_metrics()
+    jobs = JobQueue(ANALYSIS_WORKERS, ANALYSIS_QUEUE_MAX, metrics)
+    metrics.register("analysis_jobs", jobs.stats_snapshot, gauges=("queued", "running", "workers"))
+    return jobs
+
+
+@process_resource
+def get_result_store() -> PersistentCache:
+    # Resultados completos (artigos, arrays NumPy) sobrevivem a reinícios; chave = analysis_cache_key
+    store = PersistentCache(
+        ANALYSIS_RESULTS_PATH,
+        "analysis_results",
+        ttl=ANALYSIS_RESULT_TTL,
+        stale_ttl=0,
+        max_entries=ANALYSIS_RESULT_MAX_ENTRIES,
+        dumps=lambda value: pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL),
+        loads=pickle.loads,
+    )
+    get_metrics().register("analysis_results", lambda: dict(store.stats))
+    return store
+
+
+def lookup_analysis(key: str):
+    # 1º nível: memória do processo; 2º: resultados persistidos em disco
+    cache = get_analysis_cache()
+    result = cache.get(key)
+    if result is None:
+        hit = get_result_store().get(key)
+        if hit is not None:
+            result = hit[0]
+            cache.set(key, result)
+    return result
+
+
+def _transient_failure(result: dict) -> bool:
+    # Falha nas APIs externas pode ser transitória: resultado sem artigos ou sobre corpus parcial
+    # (alguma fonte não respondeu) não é memoizado
+    errors = [result.get("error")] + [m.get("error") for m in result.get("manuscripts", ())]
+    partial = result.get("partial") or any(g.get("partial") for g in result.get("groups", ()))
+    return ERROR_NO_ARTICLES in errors or bool(partial)
+
+
+def _submit_memoized(kind: str, key: str, compute, release=None):
+    # compute(job) -> resultado; memoizado em memória e em disco por key. release() libera os
+    # arquivos de upload quando não forem mais necessários (cache, job coalescido ou fila cheia)
+    jobs = get_job_queue()
+    result = lookup_analysis(key)
+    if result is not None:
+        if release:
+            release()
+        return jobs.completed(kind, key, result)
+
+    def work(job: Job) -> dict:
+        try:
+            with get_metrics().span(kind):
+                result = compute(job)
+        finally:
+            if release:
+                release()
+        result["analysis_key"] = key
+        if not _transient_failure(result):
+            get_analysis_cache().set(key, result)
+            try:
+                get_result_store().set(key, result)
+            except (pickle.PicklingError, TypeError, AttributeError, sqlite3.Error) as exc:
+                # O resultado já foi calculado: falha ao persistir só custa o cache em disco
+                logger.warning("Falha ao gravar resultado %s em disco: %s", key, exc)
+        return result
+
+    return jobs.submit(kind, key, work, on_discard=release)
+
+
+def submit_analysis(source, full_extraction: bool = False, deep_limit: int = 0, spooled: bool = False):
+    # Retorna o Job (já concluído se o resultado estava em cache) ou None se a fila está cheia.
+    # spooled=True: source é um arquivo de spool_upload, apagado quando não for mais necessário
+    release = (lambda: discard_upload(source)) if spooled else None
+
+    def compute(job: Job) -> dict:
+        def on_progress(partial):
+            # Métricas parciais enquanto as páginas seguintes ainda estão sendo baixadas
+            corpus = CitationCorpus.from_articles(partial)
+            job.detail = (
+                f"{len(corpus)} artigos recebidos até agora | h-index parcial: {corpus.h_index()} | "
+                f"Média de citações parcial: {corpus.mean_citations()}"
+            )
+
+        return run_analysis(source, full_extraction, deep_limit, on_progress, job.set_state)
+
+    return _submit_memoized("analysis", analysis_cache_key(source, full_extraction, deep_limit), compute, release)
+
+
+def comparison_cache_key(items, full_extraction: bool, deep_limit: int = 0) -> str:
+    # Nomes e ordem entram na chave: aparecem na tabela e no relatório
+    listing = "\n".join(f"{name}\t{pdf_digest(source)}" for name, source in items)
+    mode = "full" if full_extraction else "sample"
+    return f"{ANALYSIS_RESULT_FORMAT}:compare:{hashlib.sha256(listing.encode('utf-8')).hexdigest()}:{mode}:{deep_limit}"
+
+
+def submit_comparison(items, full_extraction: bool = False, deep_limit: int = 0, spooled: bool = False):
+    # items = [(nome, caminho ou bytes)]; mesmo contrato de submit_analysis
+    def release():
+        for _, source in items:
+            discard_upload(source)
+
+    return _submit_memoized(
+        "comparison",
+        comparison_cache_key(items, full_extraction, deep_limit),
+        lambda job: compare_manuscripts(items, full_extraction, deep_limit, job.set_state),
+        release if spooled else None,
+    )
+
+
+def submit_report(result: dict):
+    key = f"report:{result['analysis_key']}"
+    jobs = get_job_queue()
+    report = get_report_cache().get(result["analysis_key"])
+    if report is not None:
+        return jobs.completed("report", key, report)
+
+    def work(job: Job) -> bytes:
+        job.set_state(JOB_RENDERING)
+        return get_report_pdf(result)
+
+    return jobs.submit("report", key, work)
+
+
+def get_session_job(slot: str, session_key, submit):
+    # Um job por "slot" da sessão; reruns com a mesma entrada reencontram o job pelo ID
+    memo = st.session_state.get(slot)
+    if memo is not None and memo[0] == session_key:
+        job = get_job_queue().get(memo[1])
+        if job is not None:
+            return job
+    job = submit()
+    if job is not None:
+        st.session_state[slot] = (session_key, job.id)
+    return job
+
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def render_job_progress(job_id: str):
+    # Só este trecho reexecuta a cada intervalo; ao terminar, um rerun completo mostra o resultado
+    jobs = get_job_queue()
+    job = jobs.get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+    label = JOB_LABELS.get(job.state, job.state)
+    if job.state == JOB_QUEUED:
+        st.info(f"{label} ({jobs.stats_snapshot()['queued']} análises aguardando)")
+    else:
+        st.info(f"{label}... {job.detail}".rstrip())
+
+
+# =========================
+# ADMIN (latências por etapa)
+# =========================
+def render_admin_panel():
+    rows, counters, gauges = get_metrics().summary()
+    with st.expander("🛠️ Métricas (admin)", expanded=True):
+        st.write("### Latência por etapa")
+        st.dataframe(
+            [
+                {
+                    "etapa": row["stage"],
+                    "labels": ", ".join(f"{k}={v}" for k, v in row["labels"].items()),
+                    "n": row["count"],
+                    "p50 (ms)": round(row["p50"] * 1000, 1),
+                    "p95 (ms)": round(row["p95"] * 1000, 1),
+                }
+                for row in rows
+            ],
+            use_container_width=True,
+        )
+        st.write("### Contadores")
+        st.dataframe(
+            [
+                {"contador": name, "labels": ", ".join(f"{k}={v}" for k, v in labels), "valor": value}
+                for (name, labels), value in sorted(counters.items())
+            ],
+            use_container_width=True,
+        )
+        st.write("### Valores atuais")
+        st.dataframe(
+            [
+                {"medida": name, "labels": ", ".join(f"{k}={v}" for k, v in labels), "valor": value}
+                for (name, labels), value in sorted(gauges.items())
+            ],
+            use_container_width=True,
         )
 
-        st.success(f"✅ Tema identificado: {tema}")
-        st.metric("Score de Potencial", f"{score}%")
-        st.write(descricao)
 
-        st.write("### Indicadores bibliométricos")
+# =========================
+# APP
+# =========================
+def render_job(job, on_done) -> None:
+    if job is None:
+        st.warning(ERROR_QUEUE_FULL)
+    elif not job.finished:
+        render_job_progress(job.id)
+    elif job.state == JOB_FAILED:
+        st.error(f"❌ Falha no processamento: {job.error}")
+    else:
+        on_done(job)
+
+
+def render_analysis(result: dict, cached: bool) -> None:
+    if result.get("error"):
+        st.error(result["error"])
+        return
+
+    tema = result["tema"]
+    top_keywords = result["top_keywords"]
+    recency_ratio = result["recency_ratio"]
+    trend_momentum = result["trend_momentum"]
+    landscape = result["landscape"]
+    score = result["score"]
+    descricao = result["descricao"]
+    if cached:
+        st.caption("⚡ Análise reaproveitada do cache (mesmo PDF).")
+    if result.get("partial"):
+        st.warning(WARNING_PARTIAL_CORPUS)
+
+    st.success(f"✅ Tema identificado: {tema}")
+    st.metric("Score de Potencial", f"{score}%")
+    st.write(descricao)
+
+    st.write("### Indicadores bibliométricos")
+    st.write(
+        f"Média de citações no corpus: **{landscape['mean_citations']}** | "
+        f"Total de citações no corpus: **{landscape['total_citations']}**"
+    )
+    st.write(
+        f"FWCI proxy: **{landscape['fwci_proxy']}** | h-index: **{landscape['h_index']}** | "
+        f"g-index: **{landscape['g_index']}** | Concentração top-10: **{landscape['citation_concentration_top10']}%**"
+    )
+    st.write(f"Recência (3 anos): **{recency_ratio:.2f}%** | Momentum anual: **{trend_momentum:.2f}%**")
+    st.write(f"Aderência semântica ao corpus (TF-IDF): **{landscape['semantic_fit']}**")
+
+    st.write("### Áreas mais citadas")
+    for area, c in landscape["top_areas"]:
+        st.write(f"• {area}: {c} citações | FWCI área: {landscape['area_fwci'].get(area, 0)}")
+
+    st.write("### Palavras mais recorrentes")
+    for word in top_keywords:
+        st.write(f"• {word}")
+
+    st.write("### Top fontes (proxy de quartil)")
+    for row in landscape["source_metrics"][:10]:
         st.write(
-            f"Média de citações no corpus: **{landscape['mean_citations']}** | "
-            f"Total de citações no corpus: **{landscape['total_citations']}**"
+            f"• {row['source']} | Docs: {row['docs']} | Citações: {row['citations']} | "
+            f"Média: {row['avg_citations']} | {row['quartile']}"
         )
+
+    st.write("### Artigos mais citados")
+    for item in landscape["top_articles"][:10]:
         st.write(
-            f"FWCI proxy: **{landscape['fwci_proxy']}** | h-index: **{landscape['h_index']}** | "
-            f"g-index: **{landscape['g_index']}** | Concentração top-10: **{landscape['citation_concentration_top10']}%**"
+            f"• {item.title or 'Sem título'} | Fonte: {item.source} | "
+            f"Citações: {item.citation_count}"
         )
-        st.write(f"Recência (3 anos): **{recency_ratio:.2f}%** | Momentum anual: **{trend_momentum:.2f}%**")
 
-        st.write("### Áreas mais citadas")
-        for area, c in landscape["top_areas"]:
-            st.write(f"• {area}: {c} citações | FWCI área: {landscape['area_fwci'].get(area, 0)}")
+    st.write("### Artigos mais próximos do manuscrito")
+    for item, similarity in landscape["closest_articles"][:5]:
+        st.write(f"• {item.title or 'Sem título'} | Fonte: {item.source} | Similaridade: {similarity}")
 
-        st.write("### Palavras mais recorrentes")
-        for word in top_keywords:
-            st.write(f"• {word}")
+    render_report_download(result, "report", "report.pdf")
 
-        st.write("### Top fontes (proxy de quartil)")
-        for row in landscape["source_metrics"][:10]:
+
+def render_report_download(result: dict, slot: str, filename: str) -> None:
+    # Relatório PDF (montado só quando o usuário pede, também na fila de jobs)
+    ready = f"{slot}_ready"
+    if st.button("📄 Gerar relatório PDF", key=f"{slot}_button") or st.session_state.get(ready) == result["analysis_key"]:
+        st.session_state[ready] = result["analysis_key"]
+        job = get_session_job(f"{slot}_job", result["analysis_key"], lambda: submit_report(result))
+        render_job(
+            job,
+            lambda done: st.download_button(
+                "📥 Baixar Relatório (PDF)", done.result, filename, mime="application/pdf", key=f"{slot}_download"
+            ),
+        )
+
+
+def render_comparison(comparison: dict, cached: bool) -> None:
+    if cached:
+        st.caption("⚡ Comparação reaproveitada do cache (mesmos PDFs).")
+    groups = comparison["groups"]
+    st.success(
+        f"✅ {len(comparison['manuscripts'])} manuscritos em {len(groups)} grupo(s) temático(s): "
+        f"{len(groups)} corpus consultado(s) em vez de {sum(len(g['members']) for g in groups)}."
+    )
+    st.dataframe(comparison_table(comparison), hide_index=True, use_container_width=True)
+
+    for g, group in enumerate(groups, start=1):
+        with st.expander(f"Grupo {g}: {group['query']}"):
+            st.write(f"Manuscritos: {', '.join(group['members'])}")
+            if group.get("partial"):
+                st.warning(WARNING_PARTIAL_CORPUS)
+            landscape = group.get("landscape")
+            if landscape is None:
+                st.warning(ERROR_NO_ARTICLES)
+                continue
             st.write(
-                f"• {row['source']} | Docs: {row['docs']} | Citações: {row['citations']} | "
-                f"Média: {row['avg_citations']} | {row['quartile']}"
+                f"Artigos no corpus: **{group['total_articles']}** | Média de citações: **{landscape['mean_citations']}** | "
+                f"FWCI proxy: **{landscape['fwci_proxy']}** | h-index: **{landscape['h_index']}** | "
+                f"g-index: **{landscape['g_index']}**"
             )
+            st.write(f"Recência (3 anos): **{group['recency_ratio']:.2f}%** | Momentum anual: **{group['trend_momentum']:.2f}%**")
+            for item in landscape["top_articles"][:5]:
+                st.write(f"• {item.title or 'Sem título'} | Fonte: {item.source} | Citações: {item.citation_count}")
 
-        st.write("### Artigos mais citados")
-        for item in landscape["top_articles"][:10]:
-            st.write(
-                f"• {item.get('title','Sem título')} | Fonte: {item.get('source','N/A')} | "
-                f"Citações: {item.get('citationCount',0)}"
+    render_report_download(comparison, "compare_report", "comparison_report.pdf")
+
+
+def main():
+    st.set_page_config(page_title="CitatIA", page_icon="📚", layout="wide")
+    get_metrics_server()
+    st.title("CitatIA - Benchmark Bibliométrico (CiteScore/JCR-like)")
+
+    # Registro
+    with st.expander("📋 Registro de Usuário", expanded=False):
+        nome = st.text_input("Nome completo")
+        email = st.text_input("E-mail")
+        if st.button("Salvar Dados"):
+            if nome and email:
+                codigo = gerar_codigo_verificacao(email)
+                salvar_email_google_sheets(nome, email, codigo)
+                st.success(f"Código de verificação gerado: **{codigo}**")
+            else:
+                st.warning("⚠️ Preencha todos os campos.")
+
+    # Upload do PDF
+    st.subheader("📄 Enviar PDF para análise")
+    uploaded_file = st.file_uploader("Envie o arquivo PDF", type="pdf")
+    full_extraction = st.checkbox(
+        "Extração completa do PDF (mais lenta; por padrão são lidas só as páginas necessárias para o tema)",
+        value=PDF_EXTRACTION_MODE == "full",
+    )
+    deep_mode = st.checkbox("Modo profundo (corpus paginado com milhares de artigos; mais lento)")
+    deep_limit = 0
+    if deep_mode:
+        deep_limit = int(
+            st.number_input(
+                "Tamanho máximo do corpus",
+                min_value=100,
+                max_value=DEEP_CORPUS_MAX,
+                value=min(DEEP_CORPUS_DEFAULT, DEEP_CORPUS_MAX),
+                step=100,
             )
+        )
 
-        # Relatório PDF
-        generate_report(
-            tema=tema,
-            top_keywords=top_keywords,
-            yearly_counts=yearly,
-            recency_ratio=recency_ratio,
-            trend_momentum=trend_momentum,
-            landscape=landscape,
-            score=score,
-            descricao=descricao,
+    if uploaded_file and pdf_too_large(uploaded_file.size):
+        st.error(ERROR_PDF_TOO_LARGE)
+    elif uploaded_file:
+        job = get_session_job(
+            "analysis_job",
+            (uploaded_file.file_id, full_extraction, deep_limit),
+            lambda: submit_analysis(spool_upload(uploaded_file), full_extraction, deep_limit, spooled=True),
         )
-        with open("report.pdf", "rb") as f:
-            st.download_button("📥 Baixar Relatório (PDF)", f, "report.pdf", mime="application/pdf")
+        render_job(job, lambda done: render_analysis(done.result, done.cached))
+
+    # Comparação de vários manuscritos (temas agrupados, um corpus por grupo)
+    st.subheader("📚 Comparar manuscritos")
+    compare_files = st.file_uploader(
+        "Envie vários PDFs relacionados (rascunhos, versões)", type="pdf", accept_multiple_files=True, key="compare_files"
+    )
+    too_large = [f.name for f in compare_files if pdf_too_large(f.size)]
+    if len(compare_files) == 1:
+        st.info("Envie ao menos dois PDFs para comparar.")
+    elif len(compare_files) > COMPARE_MAX_FILES:
+        st.warning(f"⚠️ Máximo de {COMPARE_MAX_FILES} PDFs por comparação.")
+    elif too_large:
+        st.error(f"{ERROR_PDF_TOO_LARGE} ({', '.join(too_large)})")
+    elif compare_files:
+        job = get_session_job(
+            "compare_job",
+            (tuple(f.file_id for f in compare_files), full_extraction, deep_limit),
+            lambda: submit_comparison(
+                [(f.name, spool_upload(f)) for f in compare_files], full_extraction, deep_limit, spooled=True
+            ),
+        )
+        render_job(job, lambda done: render_comparison(done.result, done.cached))
 
     # Verificação
     st.header("🔐 Verificar Autenticidade")
@@ -572,6 +3430,18 @@ def main():
     st.markdown("---\nPowered By - PEAS.Co")
     render_donation_section()
 
+    # Painel admin: ?admin=<CITATIA_ADMIN_TOKEN>
+    if ADMIN_TOKEN and st.query_params.get("admin") == ADMIN_TOKEN:
+        render_admin_panel()
+
 
 if __name__ == "__main__":
-    main()
+    # O Streamlit executa este arquivo como um __main__ novo a cada rerun: classes e funções daqui não
+    # teriam caminho estável para o pickle (resultados em disco, faixas do pool de PDF). A interface
+    # roda a partir do módulo importável "app", carregado uma vez por processo como na CLI.
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    if script_dir not in sys.path:  # `streamlit run` já inclui a pasta do script; AppTest não
+        sys.path.insert(0, script_dir)
+    import app
+
+    app.main()
@@ -0,0 +1,76 @@
+"""Tempo de cold start: importa app.py em processos novos e compara com o import eager antigo.
+
+Uso:
+    python benchmarks/bench_import.py [--runs 15] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# O que app.py importava no topo antes dos imports tardios
+EAGER_DEPS = "import pdfplumber, qrcode, reportlab.platypus, reportlab.lib.styles; from PIL import Image"
+
+SCENARIOS = {
+    "app (imports tardios)": "import app",
+    "app + deps eager (antes)": f"{EAGER_DEPS}; import app",
+}
+
+
+def time_import(statement: str) -> float:
+    code = f"import time; t = time.perf_counter(); {statement}; print(time.perf_counter() - t)"
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def top_importtime(statement: str, top: int):
+    # -X importtime escreve no stderr: "import time: self [us] | cumulative | imported package"
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "-X", "importtime", "-c", statement],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        rows.append((int(parts[1]), parts[2].rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--top", type=int, default=0, help="Mostra os N módulos com maior tempo cumulativo.")
+    args = parser.parse_args(argv)
+
+    medians = {}
+    for name, statement in SCENARIOS.items():
+        samples = [time_import(statement) for _ in range(args.runs)]
+        medians[name] = statistics.median(samples)
+        print(f"{name:28s} mediana {medians[name] * 1000:8.1f} ms | min {min(samples) * 1000:8.1f} ms")
+
+    lazy, eager = medians.values()
+    print(f"{'economia no cold start':28s} {(eager - lazy) * 1000:8.1f} ms ({(1 - lazy / eager) * 100:.1f}%)")
+
+    if args.top:
+        print("\nMaiores imports cumulativos (import app):")
+        for cumulative_us, module in top_importtime("import app", args.top):
+            print(f"{cumulative_us / 1000:8.1f} ms {module}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
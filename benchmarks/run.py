@@ -0,0 +1,274 @@
+"""Suíte de benchmarks por etapa do pipeline, com baseline e detecção de regressão.
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.run                          # perfil rápido, só imprime
+    python -m benchmarks.run --save-baseline          # grava benchmarks/baseline.json
+    python -m benchmarks.run --compare                # falha (exit 1) se alguma etapa regrediu
+    python -m benchmarks.run --profile full --stages extract,landscape
+
+As APIs externas são substituídas por um stub local (benchmarks.stub_api) e o cache em disco
+aponta para um diretório temporário, então nenhuma etapa depende de rede ou de estado anterior.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks import synthetic
+from benchmarks.bench_import import time_import
+from benchmarks.stub_api import StubAPI
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+PROFILES = {
+    "quick": {
+        "extract": [10, 100],
+        "extract_sample": [100],
+        "theme": [100],
+        "fetch": [60],
+        "fetch_deep": [1000],
+        "landscape": [60, 1_000, 10_000, 100_000],
+        "report": [60],
+        "import": ["app"],
+    },
+    "full": {
+        "extract": [10, 100, 500],
+        "extract_sample": [500],
+        "theme": [500],
+        "fetch": [60],
+        "fetch_deep": [5000],
+        "landscape": [60, 1_000, 10_000, 100_000, 1_000_000],
+        "report": [60],
+        "import": ["app"],
+    },
+}
+
+
+def current_rss_mb() -> float:
+    # Mesma leitura de /proc usada pelo orçamento de memória do app (0 fora do Linux)
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+class PeakRSS:
+    # Amostra o RSS do processo em uma thread enquanto a etapa roda (não inclui processos do pool de PDF)
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.start = self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def __enter__(self):
+        self.start = self.peak = current_rss_mb()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_mb())
+
+
+def measure(fn, repeat: int, before=None) -> dict:
+    samples = []
+    with PeakRSS() as rss:
+        for _ in range(repeat):
+            if before is not None:
+                before()
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+    return {
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "runs": repeat,
+        "peak_rss_mb": round(rss.peak, 1),
+        "rss_growth_mb": round(rss.peak - rss.start, 1),
+    }
+
+
+def write_pdf(pages: int) -> str:
+    # Mesmo caminho do app: o upload vai para um arquivo em disco e a extração lê dele
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(synthetic.make_pdf(pages))
+    return f.name
+
+
+# =========================
+# ETAPAS
+# =========================
+def bench_extract(app, pages: int, repeat: int) -> dict:
+    path = write_pdf(pages)
+    cache = app.get_pdf_text_cache()
+    try:
+        return measure(lambda: app.extract_text_from_pdf(path), repeat, before=cache.clear)
+    finally:
+        os.remove(path)
+
+
+def bench_extract_sample(app, pages: int, repeat: int) -> dict:
+    path = write_pdf(pages)
+    cache = app.get_pdf_text_cache()
+    try:
+        return measure(lambda: app.extract_theme_sample(path), repeat, before=cache.clear)
+    finally:
+        os.remove(path)
+
+
+def bench_theme(app, pages: int, repeat: int) -> dict:
+    text = app.extract_text_from_pdf(synthetic.make_pdf(pages))
+    return measure(lambda: app.identify_theme(text), repeat)
+
+
+def bench_fetch(app, limit: int, repeat: int) -> dict:
+    return measure(lambda: app.fetch_popular_phrases("machine learning climate", limit), repeat)
+
+
+def bench_fetch_deep(app, max_records: int, repeat: int) -> dict:
+    def run():
+        for _ in app.stream_deep_corpus("machine learning climate", max_records):
+            pass
+
+    return measure(run, repeat)
+
+
+def bench_landscape(app, n: int, repeat: int) -> dict:
+    articles = synthetic.make_articles(n)
+    keywords = ["machine", "learning", "climate", "model"]
+
+    def run():
+        corpus = app.CitationCorpus.from_articles(articles)
+        app.get_publication_statistics(articles, corpus)
+        app.analyze_citation_landscape(articles, keywords, corpus)
+
+    return measure(run, repeat)
+
+
+def bench_report(app, n: int, repeat: int) -> dict:
+    result = app.score_manuscript("machine, learning", ["machine", "learning"], synthetic.make_articles(n))
+    return measure(lambda: app.report_from_result(result), repeat)
+
+
+def bench_import(app, statement: str, repeat: int) -> dict:
+    # Processos novos: o RSS deste processo não se aplica
+    samples = [time_import(f"import {statement}") for _ in range(repeat)]
+    return {"median": statistics.median(samples), "min": min(samples), "runs": repeat}
+
+
+STAGES = {
+    "extract": bench_extract,
+    "extract_sample": bench_extract_sample,
+    "theme": bench_theme,
+    "fetch": bench_fetch,
+    "fetch_deep": bench_fetch_deep,
+    "landscape": bench_landscape,
+    "report": bench_report,
+    "import": bench_import,
+}
+
+# Casos grandes rodam uma vez só
+HEAVY = {("extract", 500), ("landscape", 1_000_000), ("fetch_deep", 5000), ("extract", 100)}
+
+
+# =========================
+# BASELINE
+# =========================
+def compare(results: dict, baseline: dict, threshold: float, min_delta: float):
+    regressions = []
+    for case, current in results.items():
+        previous = baseline.get(case)
+        if previous is None:
+            continue
+        limit = previous["median"] * (1 + threshold)
+        # min_delta evita falso positivo em etapas de microssegundos (ruído de agendamento)
+        if current["median"] > limit and current["median"] - previous["median"] > min_delta:
+            regressions.append((case, previous["median"], current["median"]))
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline CitatIA.")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    parser.add_argument("--stages", help="Lista separada por vírgula (padrão: todas as do perfil).")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2, help="Latência simulada do stub das APIs (s).")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, metavar="PATH")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, metavar="PATH")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Regressão tolerada (0.25 = +25%%).")
+    parser.add_argument("--min-delta", type=float, default=0.005, help="Diferença absoluta mínima (s).")
+    parser.add_argument("--json", metavar="PATH", help="Grava os resultados brutos em PATH.")
+    args = parser.parse_args(argv)
+
+    if args.compare and not os.path.exists(args.compare):
+        print(
+            f"Baseline não encontrada: {args.compare} (gere com python -m benchmarks.run --save-baseline)",
+            file=sys.stderr,
+        )
+        return 2
+
+    profile = PROFILES[args.profile]
+    stages = args.stages.split(",") if args.stages else list(profile)
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"etapas desconhecidas: {', '.join(unknown)}")
+
+    stub = StubAPI(latency=args.latency).start()
+    # Configuração lida no import de app.py: precisa estar no ambiente antes
+    os.environ["CITATIA_CACHE_DIR"] = tempfile.mkdtemp(prefix="citatia-bench-")
+    os.environ["CITATIA_SEMANTIC_API"] = stub.semantic_url
+    os.environ["CITATIA_CROSSREF_API"] = stub.crossref_url
+    import app
+
+    results = {}
+    try:
+        for stage in stages:
+            for param in profile.get(stage, []):
+                case = f"{stage}/{param}"
+                repeat = 1 if (stage, param) in HEAVY else args.repeat
+                results[case] = STAGES[stage](app, param, repeat)
+                r = results[case]
+                rss = f" | pico RSS {r['peak_rss_mb']:8.1f} MB (+{r['rss_growth_mb']:.1f})" if "peak_rss_mb" in r else ""
+                print(f"{case:24s} mediana {r['median'] * 1000:10.1f} ms | min {r['min'] * 1000:10.1f} ms | n={r['runs']}{rss}")
+    finally:
+        stub.stop()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    status = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta)
+        for case, before, after in regressions:
+            print(f"REGRESSÃO {case}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms", file=sys.stderr)
+        status = 1 if regressions else 0
+        if not regressions:
+            print(f"Sem regressões acima de {args.threshold:.0%} em relação a {args.compare}")
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.save_baseline):
+            with open(args.save_baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline gravada em {args.save_baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
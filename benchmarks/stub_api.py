@@ -0,0 +1,137 @@
+"""Servidor HTTP local que imita Semantic Scholar e Crossref para os benchmarks.
+
+Serve respostas gravadas (benchmarks/fixtures/*.json, ver `record_fixtures`) ou, na falta delas,
+itens sintéticos determinísticos. Suporta offset (S2) e cursor (Crossref) e latência configurável.
+"""
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks import synthetic
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SEMANTIC_FIXTURE = "semantic_scholar.json"
+CROSSREF_FIXTURE = "crossref.json"
+
+
+def _load_items(path: str, extract):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return extract(json.load(f))
+
+
+class StubAPI:
+    def __init__(self, latency: float = 0.2, total: int = 5000, fixtures_dir: str = FIXTURES_DIR, seed: int = 0):
+        self.latency = latency
+        self.requests = 0
+        self.semantic_items = _load_items(
+            os.path.join(fixtures_dir, SEMANTIC_FIXTURE), lambda d: d.get("data", [])
+        ) or synthetic.semantic_scholar_items(total, seed)
+        self.crossref_items = _load_items(
+            os.path.join(fixtures_dir, CROSSREF_FIXTURE), lambda d: d.get("message", {}).get("items", [])
+        ) or synthetic.crossref_items(total, seed)
+        self._server = None
+
+    @property
+    def semantic_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/graph/v1/paper/search"
+
+    @property
+    def crossref_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/works"
+
+    def _semantic_page(self, query):
+        offset = int(query.get("offset", ["0"])[0])
+        limit = int(query.get("limit", ["100"])[0])
+        data = self.semantic_items[offset:offset + limit]
+        body = {"total": len(self.semantic_items), "offset": offset, "data": data}
+        if offset + limit < len(self.semantic_items):
+            body["next"] = offset + limit
+        return body
+
+    def _crossref_page(self, query):
+        cursor = query.get("cursor", [""])[0]
+        offset = int(cursor) if cursor.isdigit() else 0
+        rows = int(query.get("rows", ["20"])[0])
+        items = self.crossref_items[offset:offset + rows]
+        message = {"total-results": len(self.crossref_items), "items": items}
+        if cursor:
+            message["next-cursor"] = str(offset + rows)
+        return {"status": "ok", "message": message}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub.requests += 1
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                time.sleep(stub.latency)
+                if url.path.endswith("/paper/search"):
+                    body = stub._semantic_page(query)
+                elif url.path.endswith("/works"):
+                    body = stub._crossref_page(query)
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+    def start(self) -> "StubAPI":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def record_fixtures(query: str, rows: int = 100, fixtures_dir: str = FIXTURES_DIR) -> None:
+    # Grava uma página real de cada API para o stub reproduzir depois
+    import requests
+
+    os.makedirs(fixtures_dir, exist_ok=True)
+    semantic = requests.get(
+        "https://api.semanticscholar.org/graph/v1/paper/search",
+        params={
+            "query": query,
+            "limit": rows,
+            "fields": "title,abstract,url,externalIds,citationCount,year,fieldsOfStudy,venue",
+        },
+        timeout=30,
+    )
+    semantic.raise_for_status()
+    crossref = requests.get(
+        "https://api.crossref.org/works",
+        params={"query": query, "rows": rows, "sort": "is-referenced-by-count", "order": "desc"},
+        headers={"User-Agent": "CitatIA-bench/1.0"},
+        timeout=30,
+    )
+    crossref.raise_for_status()
+    for name, resp in ((SEMANTIC_FIXTURE, semantic), (CROSSREF_FIXTURE, crossref)):
+        with open(os.path.join(fixtures_dir, name), "w", encoding="utf-8") as f:
+            json.dump(resp.json(), f, ensure_ascii=False)
@@ -0,0 +1,94 @@
+"""Dados sintéticos determinísticos para os benchmarks: PDFs, corpora e respostas das APIs."""
+import random
+from io import BytesIO
+
+WORDS = (
+    "machine learning deep neural network model data algorithm training climate carbon emission energy "
+    "renewable sustainability policy market innovation finance health clinical patient therapy disease "
+    "education social inequality public society behavior analysis method results evaluation framework "
+    "system performance dataset survey review study approach regression classification optimization"
+).split()
+VENUES = [f"Journal of {w.title()} Research" for w in WORDS[:40]]
+AREAS = ["Computer Science", "Medicine", "Environmental Science", "Economics & Business", "Social Sciences"]
+
+
+def sentence(rng: random.Random, n_words: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n_words)).capitalize() + "."
+
+
+def make_pdf(n_pages: int, seed: int = 0, lines_per_page: int = 45) -> bytes:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    rng = random.Random(seed)
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    for page in range(n_pages):
+        y = 800
+        pdf.drawString(40, y, f"Section {page + 1}")
+        for _ in range(lines_per_page):
+            y -= 17
+            pdf.drawString(40, y, sentence(rng))
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def make_articles(n: int, seed: int = 0):
+    # Registros no formato de get_popular_phrases (token_counts calculados sob demanda)
+    from app import Article
+
+    rng = random.Random(seed)
+    articles = []
+    for i in range(n):
+        articles.append(
+            Article(
+                title=sentence(rng, 8),
+                abstract="",
+                doi=f"10.5555/synthetic.{seed}.{i}",
+                link="N/A",
+                citation_count=int(rng.paretovariate(1.2)) - 1,
+                year=rng.randint(1995, 2026) if rng.random() > 0.05 else None,
+                areas=rng.sample(AREAS, rng.choice((1, 1, 1, 2))),
+                source=rng.choice(VENUES),
+                publisher="Synthetic",
+            )
+        )
+    return articles
+
+
+def semantic_scholar_item(i: int, rng: random.Random) -> dict:
+    return {
+        "title": sentence(rng, 9),
+        "abstract": " ".join(sentence(rng) for _ in range(6)),
+        "url": f"https://example.org/s2/{i}",
+        "externalIds": {"DOI": f"10.5555/s2.{i}"},
+        "citationCount": int(rng.paretovariate(1.1)) - 1,
+        "year": rng.randint(1995, 2026),
+        "fieldsOfStudy": rng.sample(AREAS, 1) if rng.random() > 0.3 else None,
+        "venue": rng.choice(VENUES),
+    }
+
+
+def crossref_item(i: int, rng: random.Random) -> dict:
+    return {
+        "title": [sentence(rng, 9)],
+        "abstract": "<jats:p>" + " ".join(sentence(rng) for _ in range(5)) + "</jats:p>",
+        "URL": f"https://doi.org/10.5555/cr.{i}",
+        "DOI": f"10.5555/cr.{i}" if i % 7 else f"10.5555/s2.{i}",  # parte sobrepõe o S2 (exercita o dedup)
+        "is-referenced-by-count": int(rng.paretovariate(1.1)) - 1,
+        "published-print": {"date-parts": [[rng.randint(1995, 2026), 1]]},
+        "container-title": [rng.choice(VENUES)],
+        "publisher": "Synthetic Press",
+        "subject": [] if rng.random() > 0.5 else [rng.choice(AREAS)],
+    }
+
+
+def semantic_scholar_items(total: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [semantic_scholar_item(i, rng) for i in range(total)]
+
+
+def crossref_items(total: int, seed: int = 0):
+    rng = random.Random(seed + 1)
+    return [crossref_item(i, rng) for i in range(total)]
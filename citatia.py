@@ -0,0 +1,415 @@
+"""CitatIA em modo headless (sem Streamlit).
+
+Uso:
+    python -m citatia batch <diretorio> [-o resultados.jsonl] [--reports <dir>] [--workers N]
+    python -m citatia compare <pdf|diretorio> [...] [-o tabela.csv] [--report comparacao.pdf] [--deep N]
+    python -m citatia index <dump.jsonl[.gz]> [...] [--index <arquivo.sqlite3>] [--format auto|crossref|semantic]
+    python -m citatia idf [--index <arquivo.sqlite3>] [--output <df.sqlite3>]
+    python -m citatia baselines [--index <arquivo.sqlite3>] [--output <baselines.sqlite3>]
+"""
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing as mp
+import os
+import queue
+import sqlite3
+import sys
+import threading
+from concurrent.futures import Future
+
+import app
+
+# =========================
+# PIPELINE
+# =========================
+# extração (processos, CPU) -> fila limitada -> consulta + score (threads, I/O) -> fila limitada -> escrita JSONL
+_DONE = None
+WORKER_POLL = 5.0  # s sem notícias dos extratores antes de verificar se algum morreu
+ERROR_WORKER_DIED = "Processo de extração encerrado inesperadamente (código {code})."
+
+
+def _extract_worker(tasks, extracted, full_extraction: bool, worker_id: int) -> None:
+    # Paralelismo já é por arquivo: sem pool de páginas aninhado dentro de cada worker.
+    # Ao terminar envia o próprio índice: o processo pai sabe quem encerrou normalmente
+    app.PDF_WORKERS = 1
+    while True:
+        path = tasks.get()
+        if path is _DONE:
+            extracted.put(worker_id)
+            return
+        record = {"file": path}
+        try:
+            # Extração direto do arquivo: o PDF não é lido inteiro para a memória do worker
+            if app.pdf_too_large(os.path.getsize(path)):
+                record["error"] = app.ERROR_PDF_TOO_LARGE
+            elif (result := app.extract_manuscript_theme(path, full_extraction)) is None:
+                record["error"] = app.ERROR_NO_TEXT
+            else:
+                record["text"], record["tema"], record["article_keywords"] = result
+        except Exception as exc:
+            record["error"] = f"{type(exc).__name__}: {exc}"
+        extracted.put(record)
+
+
+class CorpusRegistry:
+    # Um único fetch por tema no lote inteiro; threads que pedem o mesmo tema esperam o primeiro
+    def __init__(self, limit: int, deep_limit: int = 0):
+        self.limit = limit
+        self.deep_limit = deep_limit
+        self.fetched = 0
+        self.reused = 0
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def get(self, tema: str):
+        key = app.literature_cache_key(tema, self.deep_limit or self.limit)
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+                self.fetched += 1
+            else:
+                self.reused += 1
+        if owner:
+            try:
+                if self.deep_limit:
+                    future.set_result(app.get_deep_corpus(tema, self.deep_limit))
+                else:
+                    future.set_result(app.get_popular_phrases(tema, limit=self.limit))
+            except Exception as exc:
+                future.set_exception(exc)
+        return future.result()
+
+
+def summarize(record: dict, result: dict) -> dict:
+    landscape = result["landscape"]
+    return {
+        "file": record["file"],
+        "tema": result["tema"],
+        "score": result["score"],
+        "descricao": result["descricao"],
+        "total_articles": len(result["articles"]),
+        "h_index": landscape["h_index"],
+        "g_index": landscape["g_index"],
+        "fwci_proxy": landscape["fwci_proxy"],
+        "mean_citations": landscape["mean_citations"],
+        "citation_concentration_top10": landscape["citation_concentration_top10"],
+        "keyword_overlap_ratio": landscape["keyword_overlap_ratio"],
+        "semantic_fit": landscape["semantic_fit"],
+        "recency_ratio": round(result["recency_ratio"], 2),
+        "trend_momentum": result["trend_momentum"],
+        "top_keywords": result["top_keywords"],
+    }
+
+
+def _score_worker(pending, results, corpora: CorpusRegistry, reports_dir) -> None:
+    while True:
+        record = pending.get()
+        if record is _DONE:
+            return
+        try:
+            articles = corpora.get(record["tema"])
+            if not articles:
+                out = {"file": record["file"], "tema": record["tema"], "error": app.ERROR_NO_ARTICLES}
+            else:
+                result = app.score_manuscript(record["tema"], record["article_keywords"], articles, record["text"])
+                out = summarize(record, result)
+                if reports_dir:
+                    stem = os.path.splitext(os.path.basename(record["file"]))[0]
+                    out["report"] = os.path.join(reports_dir, f"{stem}.report.pdf")
+                    app.report_from_result(result, output_path=out["report"])
+        except Exception as exc:
+            out = {"file": record["file"], "tema": record.get("tema"), "error": f"{type(exc).__name__}: {exc}"}
+        results.put(out)
+
+
+def find_pdfs(directory: str, recursive: bool = False):
+    if recursive:
+        paths = [os.path.join(root, name) for root, _, files in os.walk(directory) for name in files]
+    else:
+        paths = [os.path.join(directory, name) for name in os.listdir(directory)]
+    return sorted(p for p in paths if p.lower().endswith(".pdf") and os.path.isfile(p))
+
+
+def run_batch(
+    paths,
+    out,
+    workers: int = None,
+    io_workers: int = 4,
+    full_extraction: bool = False,
+    limit: int = 60,
+    deep_limit: int = 0,
+    reports_dir: str = None,
+    queue_size: int = None,
+) -> dict:
+    workers = max(1, workers or os.cpu_count() or 1)
+    queue_size = queue_size or workers * 2
+    if reports_dir:
+        os.makedirs(reports_dir, exist_ok=True)
+
+    # spawn: os workers não herdam threads/conexões SQLite do processo pai
+    ctx = mp.get_context("spawn")
+    tasks = ctx.Queue(maxsize=queue_size)
+    extracted = ctx.Queue(maxsize=queue_size)
+    pending = queue.Queue(maxsize=queue_size)
+    results = queue.Queue(maxsize=queue_size)
+    corpora = CorpusRegistry(limit, deep_limit)
+    stats = {"files": len(paths), "ok": 0, "errors": 0}
+
+    def feed():
+        for path in paths:
+            tasks.put(path)
+        for _ in range(workers):
+            tasks.put(_DONE)
+
+    def write():
+        while True:
+            row = results.get()
+            if row is _DONE:
+                return
+            stats["errors" if "error" in row else "ok"] += 1
+            out.write(json.dumps(row, ensure_ascii=False) + "\n")
+            out.flush()
+            print(f"[{stats['ok'] + stats['errors']}/{stats['files']}] {row['file']}", file=sys.stderr)
+
+    extractors = [
+        ctx.Process(target=_extract_worker, args=(tasks, extracted, full_extraction, i), daemon=True)
+        for i in range(workers)
+    ]
+    scorers = [
+        threading.Thread(target=_score_worker, args=(pending, results, corpora, reports_dir), daemon=True)
+        for _ in range(max(1, io_workers))
+    ]
+    feeder = threading.Thread(target=feed, daemon=True)
+    writer = threading.Thread(target=write, daemon=True)
+    for proc in extractors:
+        proc.start()
+    for thread in (feeder, writer, *scorers):
+        thread.start()
+
+    def route(record):
+        returned.add(record["file"])
+        (results if "error" in record else pending).put(record)
+
+    # Worker morto (OOM, crash no pdfminer) nunca envia o fim: vigia os processos em vez de esperar
+    returned, finished = set(), set()
+    while len(finished) < workers:
+        try:
+            message = extracted.get(timeout=WORKER_POLL)
+        except queue.Empty:
+            for i, proc in enumerate(extractors):
+                if i not in finished and not proc.is_alive():
+                    print(f"Extrator {i} encerrado com código {proc.exitcode}", file=sys.stderr)
+                    finished.add(i)
+            continue
+        if isinstance(message, int):
+            finished.add(message)
+        else:
+            route(message)
+    # Registros enviados pouco antes de um worker morrer ainda podem estar na fila
+    while True:
+        try:
+            message = extracted.get(timeout=0.5)
+        except queue.Empty:
+            break
+        if not isinstance(message, int):
+            route(message)
+
+    codes = sorted({str(proc.exitcode) for proc in extractors if proc.exitcode})
+    for path in paths:
+        if path not in returned:
+            results.put({"file": path, "error": ERROR_WORKER_DIED.format(code=", ".join(codes) or "?")})
+
+    for _ in scorers:
+        pending.put(_DONE)
+    for thread in scorers:
+        thread.join()
+    results.put(_DONE)
+    writer.join()
+    for proc in extractors:
+        proc.join(timeout=WORKER_POLL)
+
+    stats["corpus_fetches"] = corpora.fetched
+    stats["corpus_reused"] = corpora.reused
+    return stats
+
+
+def run_compare(paths, out, report_path: str = None, full_extraction: bool = False, deep_limit: int = 0) -> dict:
+    # Tabela lado a lado em CSV; corpus buscado e analisado uma vez por grupo de temas parecidos
+    def on_stage(stage, detail=""):
+        print(f"{app.JOB_LABELS.get(stage, stage)} {detail}".rstrip(), file=sys.stderr)
+
+    comparison = app.compare_manuscripts(
+        [(os.path.basename(p), p) for p in paths], full_extraction, deep_limit, on_stage
+    )
+    writer = csv.DictWriter(out, fieldnames=app.COMPARISON_COLUMNS)
+    writer.writeheader()
+    writer.writerows(app.comparison_table(comparison))
+    if report_path:
+        app.report_from_result(comparison, output_path=report_path)
+    errors = sum(1 for m in comparison["manuscripts"] if "error" in m)
+    return {"files": len(paths), "ok": len(paths) - errors, "errors": errors, "groups": len(comparison["groups"])}
+
+
+def build_index(paths, index_path: str, fmt: str = "auto") -> dict:
+    index = app.LocalLiteratureIndex(index_path)
+    stats = {"files": len(paths), "records": 0}
+    for path in paths:
+        count = index.ingest(app.iter_dump_records(path, fmt))
+        stats["records"] += count
+        print(f"{path}: {count} registros", file=sys.stderr)
+    index.optimize()
+    stats["indexed"] = len(index)
+    return stats
+
+
+def build_df_table(index_path: str, output: str) -> dict:
+    # Frequência documental dos termos de título + resumo de todo o índice local
+    conn = sqlite3.connect(index_path)
+    try:
+        documents = (f"{title}. {abstract}" for title, abstract in conn.execute("SELECT title, abstract FROM papers"))
+        n_docs = app.DocumentFrequencyTable(output).rebuild(documents)
+    finally:
+        conn.close()
+    return {"documents": n_docs, "output": output}
+
+
+def build_baselines(index_path: str, output: str, include_cache: bool = False) -> dict:
+    # Médias de citações por área e ano a partir do índice local (coleção sem viés de seleção).
+    # include_cache soma os corpora em cache, que vêm das APIs ordenados pelos mais citados e inflam as médias
+    sources = []
+    if os.path.isfile(index_path):
+        sources.append(app.LocalLiteratureIndex(index_path).iter_articles())
+    if include_cache:
+        cache = app.get_literature_cache()
+        for prefix in (f"{app.LITERATURE_CACHE_FORMAT}:", f"deep:{app.LITERATURE_CACHE_FORMAT}:"):
+            sources.append(article for rows in cache.iter_values(prefix) for article in app.articles_from_rows(rows))
+    table = app.FieldBaselineTable(output)
+    articles = table.rebuild(itertools.chain.from_iterable(sources))
+    cells = table.snapshot().cells
+    return {"articles": articles, "areas": len({area for area, _ in cells}), "cells": len(cells), "output": output}
+
+
+# =========================
+# CLI
+# =========================
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m citatia", description="CitatIA sem interface (modo lote).")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    batch = sub.add_parser("batch", help="Pontua todos os PDFs de um diretório e grava JSONL.")
+    batch.add_argument("directory")
+    batch.add_argument("-o", "--output", default="-", help="Arquivo JSONL de saída (padrão: stdout).")
+    batch.add_argument("--reports", metavar="DIR", help="Também grava o relatório PDF de cada manuscrito em DIR.")
+    batch.add_argument("--workers", type=int, default=None, help="Processos de extração (padrão: nº de CPUs).")
+    batch.add_argument("--io-workers", type=int, default=4, help="Threads de consulta/score.")
+    batch.add_argument("--full", action="store_true", help="Extração completa do PDF em vez da amostra de tema.")
+    batch.add_argument("--limit", type=int, default=60, help="Artigos por tema (modo normal).")
+    batch.add_argument("--deep", type=int, default=0, metavar="N", help="Modo profundo com corpus de até N artigos.")
+    batch.add_argument("-r", "--recursive", action="store_true")
+
+    compare = sub.add_parser("compare", help="Compara vários manuscritos lado a lado (corpus compartilhado por tema).")
+    compare.add_argument("paths", nargs="+", help="PDFs e/ou diretórios com PDFs.")
+    compare.add_argument("-o", "--output", default="-", help="Tabela CSV de saída (padrão: stdout).")
+    compare.add_argument("--report", metavar="PDF", help="Também grava o relatório combinado em PDF.")
+    compare.add_argument("--full", action="store_true", help="Extração completa do PDF em vez da amostra de tema.")
+    compare.add_argument("--deep", type=int, default=0, metavar="N", help="Modo profundo com corpus de até N artigos.")
+
+    index = sub.add_parser("index", help="Carrega dumps JSONL do Crossref/Semantic Scholar no índice local.")
+    index.add_argument("dumps", nargs="+", help="Arquivos .jsonl ou .jsonl.gz.")
+    index.add_argument("--index", default=app.LOCAL_INDEX_PATH, help="Arquivo SQLite do índice (padrão: %(default)s).")
+    index.add_argument("--format", choices=("auto", "crossref", "semantic"), default="auto")
+
+    idf = sub.add_parser("idf", help="Gera a tabela de frequência documental (IDF) a partir do índice local.")
+    idf.add_argument("--index", default=app.LOCAL_INDEX_PATH, help="Índice local de origem (padrão: %(default)s).")
+    idf.add_argument("--output", default=app.DF_TABLE_PATH, help="Tabela gerada (padrão: %(default)s).")
+
+    baselines = sub.add_parser(
+        "baselines", help="Recalcula as médias de citações por área e ano a partir do índice local."
+    )
+    baselines.add_argument("--index", default=app.LOCAL_INDEX_PATH, help="Índice local de origem (padrão: %(default)s).")
+    baselines.add_argument("--output", default=app.FIELD_BASELINES_PATH, help="Tabela gerada (padrão: %(default)s).")
+    baselines.add_argument(
+        "--include-cache",
+        action="store_true",
+        help="Soma os corpora em cache das APIs (enviesados para os mais citados; inflam as médias).",
+    )
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    if args.command == "batch":
+        if not os.path.isdir(args.directory):
+            print(f"Diretório não encontrado: {args.directory}", file=sys.stderr)
+            return 2
+        paths = find_pdfs(args.directory, args.recursive)
+        if not paths:
+            print(f"Nenhum PDF encontrado em {args.directory}", file=sys.stderr)
+            return 1
+        out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+        try:
+            stats = run_batch(
+                paths,
+                out,
+                workers=args.workers,
+                io_workers=args.io_workers,
+                full_extraction=args.full,
+                limit=args.limit,
+                deep_limit=args.deep,
+                reports_dir=args.reports,
+            )
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        print(json.dumps(stats), file=sys.stderr)
+        return 0 if stats["errors"] < stats["files"] else 1
+
+    if args.command == "compare":
+        missing = [p for p in args.paths if not os.path.exists(p)]
+        if missing:
+            print(f"Arquivo não encontrado: {', '.join(missing)}", file=sys.stderr)
+            return 2
+        paths = [pdf for p in args.paths for pdf in (find_pdfs(p) if os.path.isdir(p) else [p])]
+        if len(paths) < 2:
+            print("Informe ao menos dois PDFs para comparar.", file=sys.stderr)
+            return 1
+        out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+        try:
+            stats = run_compare(paths, out, args.report, args.full, args.deep)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        print(json.dumps(stats), file=sys.stderr)
+        return 0 if stats["errors"] < stats["files"] else 1
+
+    if args.command == "index":
+        missing = [p for p in args.dumps if not os.path.isfile(p)]
+        if missing:
+            print(f"Arquivo não encontrado: {', '.join(missing)}", file=sys.stderr)
+            return 2
+        print(json.dumps(build_index(args.dumps, args.index, args.format)), file=sys.stderr)
+        return 0
+
+    if args.command == "idf":
+        if not os.path.isfile(args.index):
+            print(f"Índice local não encontrado: {args.index} (gere com python -m citatia index)", file=sys.stderr)
+            return 2
+        print(json.dumps(build_df_table(args.index, args.output)), file=sys.stderr)
+        return 0
+
+    if args.command == "baselines":
+        if not os.path.isfile(args.index) and not args.include_cache:
+            print(f"Índice local não encontrado: {args.index} (gere com python -m citatia index)", file=sys.stderr)
+            return 2
+        print(json.dumps(build_baselines(args.index, args.output, args.include_cache)), file=sys.stderr)
+        return 0
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+# Casos de borda do dedup (DedupIndex): python -m pytest tests
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+TITLE = "A very long study of graph neural networks for molecular property prediction"
+
+
+def article(title, doi="N/A", citations=1, year=2020):
+    return app.Article(title, "", doi, "", citations, year, (), "s", "p")
+
+
+def dedup(*articles):
+    index = app.DedupIndex()
+    index.add_many(list(articles))
+    return len(index), dict(index.stats)
+
+
+def test_same_doi_merges_case_insensitively():
+    assert dedup(article(TITLE, "10.1/a"), article(TITLE, "10.1/A")) == (1, {"doi": 1})
+
+
+def test_punctuation_variants_without_doi_merge():
+    assert dedup(article(TITLE + "."), article(TITLE.replace("graph", "Graph") + " ")) == (1, {"title": 1})
+    count, stats = dedup(article(TITLE), article(TITLE.replace("molecular", "molecule")))
+    assert count == 1 and stats == {"minhash": 1}
+
+
+def test_doi_and_no_doi_with_same_title_merge():
+    assert dedup(article(TITLE), article(TITLE, "10.1/a")) == (1, {"title": 1})
+
+
+def test_different_dois_never_merge_by_title():
+    assert dedup(article(TITLE, "10.1/a"), article(TITLE, "10.1/b"))[0] == 2
+    assert dedup(article(TITLE + " Part 1", "10.1/a"), article(TITLE + " Part 2", "10.1/b"))[0] == 2
+
+
+def test_preprint_merges_with_one_published_version():
+    assert dedup(article(TITLE, "10.48550/arxiv.1"), article(TITLE + ".", "10.1/a"))[0] == 1
+    assert dedup(article(TITLE, "10.48550/arxiv.1"), article(TITLE, "10.1/a"), article(TITLE, "10.1/b"))[0] == 2
+
+
+def test_series_parts_without_doi_stay_apart():
+    assert dedup(article(TITLE + " Part 1"), article(TITLE + " Part 2"))[0] == 2
+    assert dedup(article(TITLE + ", Vol. II"), article(TITLE + ", Vol. III"))[0] == 2
+    assert dedup(article(TITLE + " 1"), article(TITLE + " 2"))[0] == 2
+    assert dedup(article(TITLE + " Part 1"), article(TITLE + " Part 1."))[0] == 1
+
+
+def test_short_titles_without_doi_only_merge_on_equality():
+    assert dedup(article("Editorial"), article("Editorial"))[0] == 1
+    assert dedup(article("Editorial"), article("Editorials"))[0] == 2
+
+
+def test_year_gap_blocks_near_duplicates():
+    assert dedup(article(TITLE, year=2001), article(TITLE.replace("molecular", "molecule"), year=2010))[0] == 2
+
+
+def test_keeps_most_cited_version():
+    index = app.DedupIndex()
+    index.add_many([article(TITLE, "10.48550/arxiv.1", citations=3), article(TITLE, "10.1/a", citations=9)])
+    [(_, kept)] = index.entries.values()
+    assert kept.doi == "10.1/a"
@@ -0,0 +1,60 @@
+# TfidfMatrix contra uma implementação densa direta (sem tabela DF: IDF do próprio corpus)
+import math
+import os
+import random
+import sys
+from collections import Counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+WORDS = "network learning climate policy energy model graph protein market health urban ocean signal".split()
+
+
+def corpus(n, seed=0):
+    rng = random.Random(seed)
+    articles = []
+    for _ in range(n):
+        title = " ".join(rng.choice(WORDS) for _ in range(6))
+        abstract = " ".join(rng.choice(WORDS + ["the", "and", "2020", "of"]) for _ in range(rng.randint(0, 30)))
+        articles.append(app.Article(title, abstract, "N/A", "", 0, 2020, (), "s", "p"))
+    return articles
+
+
+def reference(query_text, articles):
+    docs = [Counter(app.tokenize_keywords(a.phrase)) for a in articles]
+    query = Counter(app.tokenize_keywords(query_text))
+    terms = sorted(set().union(*docs) | set(query))
+    df = {t: sum(1 for d in docs if t in d) for t in terms}
+    idf = {t: math.log((1 + len(docs)) / (1 + df[t])) + 1 for t in terms}
+
+    def vector(counts):
+        v = np.array([(1 + math.log(counts[t])) * idf[t] if counts[t] else 0.0 for t in terms])
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    matrix = np.array([vector(d) for d in docs])
+    q = vector(query)
+    centroid = matrix.sum(axis=0)
+    centroid = centroid / np.linalg.norm(centroid) if np.linalg.norm(centroid) else centroid
+    return matrix @ q, float(q @ centroid)
+
+
+def test_matches_dense_reference():
+    articles = corpus(300)
+    matrix = app.TfidfMatrix(articles)
+    for query in ("graph network protein", "climate climate policy unknownterm", "urban ocean 2020 the"):
+        similarities, fit = matrix.similarity(query)
+        expected, expected_fit = reference(query, articles)
+        assert np.allclose(similarities, expected)
+        assert math.isclose(fit, expected_fit, abs_tol=1e-12)
+
+
+def test_empty_inputs():
+    similarities, fit = app.TfidfMatrix(corpus(5)).similarity("the and of")
+    assert not similarities.any() and fit == 0.0
+    similarities, fit = app.TfidfMatrix([]).similarity("graph")
+    assert len(similarities) == 0 and fit == 0.0